@@ -1,31 +1,34 @@
 import os
 from datetime import datetime
+from functools import partial
 import pandas as pd
-import numpy as np
 import streamlit as st
 
-from shroomdk import ShroomDK
-
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import plotly.io as pio
 
-from daily_trends import get_daily_team_fig, get_daily_trends
-from player_trends import (
-    get_fig_moment_player_position,
-    get_fig_moment_playtype,
-    get_fig_player_seasons,
-    get_fig_player_seasons_price,
+from myutils import human_format_single
+from arrowdecode import decode_pages, rows_to_table
+from datasource import fetch_pages, get_source
+from figcache import cached_figure
+from prerendered import PRERENDERED_DIR, PrerenderedFigures
+from perf import (
+    finish_run,
+    get_counters,
+    get_run,
+    get_stats,
+    is_panel_enabled,
+    start_run,
+    timed,
 )
-from seasonal_trends import get_fig_moment_season, get_fig_week_season
-from team_trends import get_fig_moment, get_fig_team_season, get_fig_team_season_total
-from myutils import get_non_weekends, get_weekends, human_format, human_format_single
-
-pio.templates.default = "plotly_dark"
+from ingest import SEASON_START, IncrementalLoader
+from queryplan import FrameLayer, QueryLayer
+from refresher import Refresher
+from schema import COLUMNS
+from sharedstore import SharedStore
+from snapshot import read_latest_snapshot, write_snapshot
+from windows import CUSTOM_WINDOW, get_custom_label, get_named_windows
 
-API_KEY = os.getenv("API_KEY")
-sdk = ShroomDK(API_KEY)
+start_run()
 
 st.set_page_config(
     page_title="NFL All Day - Preseason",
@@ -65,33 +68,87 @@ st.markdown(hide_st_style, unsafe_allow_html=True)
 st.success("Please Note: All the dates and time are in US/New York time.", icon="⏰")
 
 
-@st.cache(allow_output_mutation=True, ttl=30 * 60, show_spinner=False)
+DATA_MODE = os.getenv("DATA_MODE", "rows")
+
+
+def run_query(source, sql, names=COLUMNS):
+    with timed("query") as fields:
+        tables = fetch_pages(source, sql, partial(rows_to_table, names=names))
+        fields["rows"] = sum(table.num_rows for table in tables)
+    with timed("decode", rows=fields["rows"]):
+        return decode_pages(tables)
+
+
+@st.experimental_singleton(show_spinner=False)
+def get_prerendered():
+    return PrerenderedFigures(PRERENDERED_DIR)
+
+
+def plot(container, builder, *args, version=None):
+    # Figures render_all.py wrote for the timeframe are served as they are
+    # until the data is newer than the render, custom ranges (and figures it
+    # has not rendered) are built live.
+    fig = get_prerendered().get(builder, args, version) if PRERENDERED_DIR else None
+    if fig is None:
+        # Loading the template takes a while, only figures built here need
+        # it (prerendered ones carry theirs).
+        if pio.templates.default != "plotly_dark":
+            pio.templates.default = "plotly_dark"
+        fig = cached_figure(builder, *args, version=version)
+    # Includes serializing the figure, streamlit does that in plotly_chart.
+    with timed("plotly_chart", figure=builder.__name__):
+        container.plotly_chart(fig, use_container_width=True)
+
+
+DATA_TTL = 30 * 60
+
+
+# Singletons only hash their own source, st.cache would hash every function
+# they reference (down to the perf thread locals).
+@st.experimental_singleton(show_spinner=False)
+def get_refresher():
+    # One per process, so every session shares the scheduled refreshes and
+    # at most one query per dataset or grain is in flight.
+    return Refresher()
+
+
+@st.experimental_singleton(show_spinner=False)
+def get_loader():
+    loader = IncrementalLoader(
+        partial(run_query, get_source()),
+        on_refresh=write_snapshot,
+        refresher=get_refresher(),
+    )
+    loader.restore(read_latest_snapshot())
+    loader.schedule(DATA_TTL)
+    return loader
+
+
 def load_data():
-    daily_sales_sql = f"""
-    select 
-        convert_timezone('UTC', 'America/New_York', block_timestamp::timestamp_ntz)::date as date, 
-        moment_tier, 
-        player, 
-        team, 
-        season, 
-        week,
-        play_type,
-        MOMENT_STATS_FULL:metadata:playerPosition as player_position,
-        avg(price) as avg_price, 
-        sum(price) as total, 
-        count(distinct seller) as sellers,
-        count(distinct buyer) as buyers, 
-        count(distinct tx_id) as sales 
-    from flow.core.ez_nft_sales s
-        inner join flow.core.dim_allday_metadata m 
-            on m.nft_collection=s.nft_collection 
-            and m.nft_id=s.nft_id
-    where 
-        block_timestamp >= '2022-08-01' 
-        and TX_SUCCEEDED='TRUE'
-    group by date, moment_tier, player, team, season, week, play_type, player_position
-    """
-    return pd.DataFrame(sdk.query(daily_sales_sql).records)
+    return get_loader().get(ttl=DATA_TTL)
+
+
+@st.experimental_singleton(show_spinner=False)
+def get_shared_store():
+    store = SharedStore(partial(run_query, get_source()), refresher=get_refresher())
+    store.schedule(DATA_TTL)
+    return store
+
+
+def load_shared_data():
+    return get_shared_store().get(ttl=DATA_TTL)
+
+
+@st.experimental_singleton(show_spinner=False)
+def get_query_layer():
+    # "grains" queries just the rollups the figures declare, "rows" loads the
+    # eight dimension rows once and rolls everything up locally, "shared" does
+    # the same from an Arrow file one process per host refreshes.
+    if DATA_MODE == "rows":
+        return FrameLayer(load_data)
+    if DATA_MODE == "shared":
+        return FrameLayer(load_shared_data)
+    return QueryLayer(partial(run_query, get_source()), refresher=get_refresher())
 
 
 st.text("")
@@ -106,34 +163,62 @@ date_col3.metric(
     "28th of August",
 )
 st.header("")
-tab1, tab2, tab3, tab4, tab5 = st.tabs(
-    [
-        "All Days - Daily trends",
-        "Teams trends",
-        "Player trends",
-        "Seasonal trends",
-        "About",
-    ]
-)
+TIMEFRAMES = get_named_windows()
 
-with st.spinner("Stay tight lads, we're throwing around the old pig skin..."):
-    df_daily_sales = load_data()
-df_daily_sales.date = pd.to_datetime(df_daily_sales.date)
-df_sum = df_daily_sales.groupby("date").sum().reset_index()
-df_preseason = df_sum[df_sum.date >= datetime(2022, 8, 4)]
-df_preseason = df_preseason[df_preseason.date <= datetime(2022, 8, 28)]
-df_since_preseason = df_daily_sales[df_daily_sales.date > datetime(2022, 8, 28)]
-df_daily_sales_ps = df_daily_sales[df_daily_sales.date >= datetime(2022, 8, 4)]
-df_daily_sales_ps = df_daily_sales_ps[df_daily_sales_ps.date <= datetime(2022, 8, 28)]
-
-dataframes = {
-    "After Preseason": df_since_preseason,
-    "During Preseason": df_daily_sales_ps,
-}
 
-with tab1:
+def select_timeframe(key):
+    # The label goes into the figure titles, the window into the queries.
+    label = st.selectbox(
+        "Select the timeframe",
+        options=list(TIMEFRAMES) + [CUSTOM_WINDOW],
+        key=key,
+    )
+    if label != CUSTOM_WINDOW:
+        return label, TIMEFRAMES[label]
+    first_day = pd.Timestamp(SEASON_START).date()
+    today = datetime.now().date()
+    # While the range is being picked there is only a start date.
+    dates = st.date_input(
+        "Select the dates",
+        value=(first_day, today),
+        min_value=first_day,
+        max_value=today,
+        key=f"{key}_dates",
+    )
+    window = (dates[0].isoformat(), dates[-1].isoformat())
+    return get_custom_label(window), window
+
+
+def get_tab_rollup(builders, window=None, grains=()):
+    grains = [builder.grain for builder in builders] + list(grains)
+    with st.spinner("Stay tight lads, we're throwing around the old pig skin..."):
+        return get_query_layer().rollup(grains, window)
+
+
+def render_daily_trends():
+    # Figure modules (and plotly.express with them) are imported on first use,
+    # so the page starts rendering before them and tabs that are not opened
+    # never load theirs.
+    from daily_trends import get_daily_team_fig, get_daily_trends
+
+    rollup_all = get_tab_rollup(
+        [get_daily_trends, get_daily_team_fig], grains=[("date", "phase", "game_day")]
+    )
+    data_version = rollup_all.version
+    # Both sketches, so the Preseason wallets below roll up from the days.
+    df_days = rollup_all.get(
+        "date", "phase", "game_day", estimates=["unique_buyers", "unique_sellers"]
+    )
+    df_sum = rollup_all.get("date")
+    df_preseason = df_days[df_days.phase == "Preseason"]
+    game_days = (
+        df_preseason.groupby("game_day")
+        .total.sum()
+        .reindex([True, False], fill_value=0)
+    )
+
     st.subheader("How did daily sales go during this Preseason")
-    st.plotly_chart(get_daily_trends(df_sum), use_container_width=True)
+    plot(st, get_daily_trends, df_sum, version=data_version)
 
     m_col1, m_col2, m_col3, m_col4 = st.columns(4)
     m_col1.metric(
@@ -152,7 +237,23 @@ with tab1:
 
     m_col4.metric(
         "The Volumes in Weekends than in other days in Preseason",
-        f"{round(get_weekends(df_preseason).total.sum() / get_non_weekends(df_preseason).total.sum(), 1)}X",
+        f"{round(game_days[True] / game_days[False], 1)}X",
+    )
+    # Distinct wallets come from the merged sketches, summing the per day
+    # counts would count a wallet once for every day it traded.
+    wallets = rollup_all.get("phase", estimates=["unique_buyers", "unique_sellers"])
+    wallets = wallets[wallets.phase == "Preseason"]
+    w_col1, w_col2, w_col3 = st.columns(3)
+    w_col1.metric(
+        "Unique buyers in Preseason", human_format_single(wallets.unique_buyers.sum())
+    )
+    w_col2.metric(
+        "Unique sellers in Preseason",
+        human_format_single(wallets.unique_sellers.sum()),
+    )
+    w_col3.metric(
+        "Unique buyers per day in Preseason",
+        human_format_single(df_preseason.unique_buyers.mean()),
     )
     st.info(
         "The interest seems to have picked up with the Preseason, specially in the **Hall of Fame Weekend** and The **Second Preseason Weekend**. On average weekends saw a **3.6 X** increase in sales volume than the other days during the preseason. However the interest had died down since then but the fan interest has picked up since the start of the season."
@@ -161,7 +262,7 @@ with tab1:
     st.markdown("""---""")
     st.text("")
     st.subheader("Do the match schedule impact the team popularity")
-    st.plotly_chart(get_daily_team_fig(df_daily_sales), use_container_width=True)
+    plot(st, get_daily_team_fig, rollup_all, version=data_version)
     g_col1, g_col2 = st.columns(2)
     g_col1.image(
         "https://raw.githubusercontent.com/jokersden/nflallday/main/images/hof.png"
@@ -189,19 +290,24 @@ with tab1:
     st.markdown("---")
     st.error("Team trends in next tab...", icon="🏈")
 
-with tab2:
+
+def render_team_trends():
+    from team_trends import (
+        get_fig_moment,
+        get_fig_team_season,
+        get_fig_team_season_total,
+    )
+
     st.error(
-        "You can switch between preseason data and data since preseason from below."
+        "You can switch between the preseason, the time since, a game window or any date range from below."
     )
-    val_team = st.selectbox(
-        "Select the timeframe",
-        options=["During Preseason", "After Preseason"],
-        key="team",
+    val_team, window = select_timeframe("team")
+    rollup = get_tab_rollup(
+        [get_fig_moment, get_fig_team_season_total, get_fig_team_season], window
     )
+    data_version = rollup.version
 
-    st.plotly_chart(
-        get_fig_moment(dataframes[val_team], val_team), use_container_width=True
-    )
+    plot(st, get_fig_moment, rollup, val_team, version=data_version)
     st.warning(
         "ULTIMATE tier has been added after the Preseason... New York Giants were the first to sell the first Ultimate tier moment!!"
     )
@@ -212,14 +318,9 @@ with tab2:
         " highest amount of sales volume. Their victory against Rams on 9th may have sparked some interest among the fans to buy some of their exclusive moments."
     )
     team_col1, team_col2 = st.columns(2)
-    team_col1.plotly_chart(
-        get_fig_team_season_total(dataframes[val_team], val_team),
-        use_container_width=True,
-    )
+    plot(team_col1, get_fig_team_season_total, rollup, val_team, version=data_version)
 
-    team_col2.plotly_chart(
-        get_fig_team_season(dataframes[val_team], val_team), use_container_width=True
-    )
+    plot(team_col2, get_fig_team_season, rollup, val_team, version=data_version)
     st.info(
         "Moments from 2021 were obviously the fan favorite in terms of the total value and also majority of the teams "
         "had sold 2021 moments more often than other years. Packers seems to have priceless moments across multiple years/seasons"
@@ -235,20 +336,30 @@ with tab2:
     st.error("Player trends in next tab...", icon="🏈")
 
 
-with tab3:
-    st.error(
-        "You can switch between preseason data and data since preseason from below."
-    )
-    val_player = st.selectbox(
-        "Select the timeframe",
-        options=["During Preseason", "After Preseason"],
-        key="player",
+def render_player_trends():
+    from player_trends import (
+        get_fig_moment_player_position,
+        get_fig_moment_playtype,
+        get_fig_player_seasons,
+        get_fig_player_seasons_price,
     )
 
-    st.plotly_chart(
-        get_fig_player_seasons(dataframes[val_player], val_player),
-        use_container_width=True,
-    )
+    st.error(
+        "You can switch between the preseason, the time since, a game window or any date range from below."
+    )
+    val_player, window = select_timeframe("player")
+    rollup = get_tab_rollup(
+        [
+            get_fig_player_seasons,
+            get_fig_player_seasons_price,
+            get_fig_moment_playtype,
+            get_fig_moment_player_position,
+        ],
+        window,
+    )
+    data_version = rollup.version
+
+    plot(st, get_fig_player_seasons, rollup, val_player, version=data_version)
     st.info(
         "Well well well, Tom Brady and his 2021 moments have been what fans have spent their $$ on, barring the N/A or Team Play as a player. "
         "41 out of top 50 most sold players during preseason, found that successful moments in 2021. "
@@ -257,27 +368,18 @@ with tab3:
         " Odell Beckham Jr and Richard Sherman. Where their previous seasons have also surfaced along with 2021 moments."
     )
 
-    st.plotly_chart(
-        get_fig_player_seasons_price(dataframes[val_player], val_player),
-        use_container_width=True,
-    )
+    plot(st, get_fig_player_seasons_price, rollup, val_player, version=data_version)
     st.info(
         "QB (quaterback) position seems to be the fan favorite, where they'd pay a high price to get moments from players who plays that position like Trey Lance, Aaron Rodgers"
         " Trevor Lawrance, Tom Brady to name a few. And the other player position that people wanted at a higher price was WR (Wide Receiver)."
         " during both preseason and after preseason Trey Lance, who plays QB, had his moments which were significantly higher than the other players."
     )
-    st.plotly_chart(
-        get_fig_moment_playtype(dataframes[val_player], val_player),
-        use_container_width=True,
-    )
+    plot(st, get_fig_moment_playtype, rollup, val_player, version=data_version)
     st.info(
         "Although Player Melt produced higher amount with legendary tier moments, Reception gained most $$ from moments sales during preseason as well as after preseason, followed by Pass during the preseason but Rush overtook Pass after preseason sales (insight: 13th Sept)."
         " Ineterestingly Reception had the first Ultimate tier moment as well."
     )
-    st.plotly_chart(
-        get_fig_moment_player_position(dataframes[val_player], val_player),
-        use_container_width=True,
-    )
+    plot(st, get_fig_moment_player_position, rollup, val_player, version=data_version)
     st.info(
         "Although 2-Pt Attempt with a particular player position were pricier during the preseason sales, Tight End Player melts became more dominant in terms of the average price "
         "since the end of the preseason until 13th Sept (at the time of this writing). However it was not that TE Player melt suddenly became pricier but the other moments with play types and positions which were pricier"
@@ -286,26 +388,21 @@ with tab3:
     st.markdown("---")
     st.markdown("---")
 
-with tab4:
+
+def render_seasonal_trends():
+    from seasonal_trends import get_fig_moment_season, get_fig_week_season
+
     st.error(
-        "You can switch between preseason data and data since preseason from below."
-    )
-    val_season = st.selectbox(
-        "Select the timeframe",
-        options=["During Preseason", "After Preseason"],
-        key="season",
-    )
-    st.plotly_chart(
-        get_fig_moment_season(dataframes[val_season], val_season),
-        use_container_width=True,
+        "You can switch between the preseason, the time since, a game window or any date range from below."
     )
+    val_season, window = select_timeframe("season")
+    rollup = get_tab_rollup([get_fig_moment_season, get_fig_week_season], window)
+    data_version = rollup.version
+    plot(st, get_fig_moment_season, rollup, val_season, version=data_version)
     st.info(
         "Of course Legendary tier is expensive, and the legendary tier 2021 moments were the most expensive. However, After preseason an Ultimate tier 2014 moments were sold which is pricier than legendary."
     )
-    st.plotly_chart(
-        get_fig_week_season(dataframes[val_season], val_season),
-        use_container_width=True,
-    )
+    plot(st, get_fig_week_season, rollup, val_season, version=data_version)
     st.info(
         "The week 14th has produced most of the memorable moments that fans have bought during and after preseason and 20th was the least. 2021 season dominates the volumes interms of season in all these weeks."
     )
@@ -313,7 +410,7 @@ with tab4:
     st.markdown("---")
 
 
-with tab5:
+def render_about():
     st.write(
         "Hey friends, This was created by joker#2418 as a part of the tournament organized by FlipsideCrypto on NFL AllDay data. This dashboard was intended to show different trends in the buying during the Preseason specifically and then after the preseason. The insights were added on 13th of Spetember although the dashboard updates with ShroomDK. Following source was used to find dates and other info: https://operations.nfl.com/gameday/nfl-schedule/2022-23-important-nfl-dates/"
     )
@@ -334,7 +431,11 @@ with tab5:
         sum(price) as total, 
         count(distinct seller) as sellers,
         count(distinct buyer) as buyers, 
-        count(distinct tx_id) as sales 
+        count(distinct tx_id) as sales,
+        count(price) as price_count,
+        approx_percentile_accumulate(price) as price_digest,
+        hll_export(hll_accumulate(buyer)) as buyers_hll,
+        hll_export(hll_accumulate(seller)) as sellers_hll
     from flow.core.ez_nft_sales s
         inner join flow.core.dim_allday_metadata m 
             on m.nft_collection=s.nft_collection 
@@ -345,3 +446,31 @@ with tab5:
     group by date, moment_tier, player, team, season, week, play_type, player_position""",
         language="sql",
     )
+
+
+def render_perf_panel(run):
+    with st.expander("Performance", expanded=True):
+        st.caption(f"Run {run.id}: {run.elapsed_ms:.0f} ms")
+        st.dataframe(pd.DataFrame(run.stages))
+        st.caption("Rolling p50/p95 per stage")
+        st.dataframe(pd.DataFrame(get_stats()))
+        st.caption("Counters (this run / since start)")
+        st.json(dict(run=dict(run.counters), total=get_counters()))
+
+
+TABS = {
+    "All Days - Daily trends": render_daily_trends,
+    "Teams trends": render_team_trends,
+    "Player trends": render_player_trends,
+    "Seasonal trends": render_seasonal_trends,
+    "About": render_about,
+}
+# Only the selected tab runs, st.tabs would execute every tab body on each rerun.
+selected_tab = st.radio(
+    "Tab", list(TABS), horizontal=True, key="tab", label_visibility="collapsed"
+)
+TABS[selected_tab]()
+
+if is_panel_enabled(st.experimental_get_query_params()):
+    render_perf_panel(get_run())
+finish_run()
@@ -0,0 +1,95 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import hll
+import tdigest
+from hll import SKETCH_TYPE, SKETCHES
+from schema import COLUMNS, DIMENSIONS, normalize
+from tdigest import DIGESTS
+
+MEASURE_TYPES = {
+    "avg_price": pa.float32(),
+    "total": pa.float32(),
+    "sellers": pa.int32(),
+    "buyers": pa.int32(),
+    "sales": pa.int32(),
+    "price_count": pa.int32(),
+}
+
+
+def to_strings(values):
+    try:
+        return pa.array(values, type=pa.string())
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        return pa.array(values).cast(pa.string())
+
+
+def to_dates(values):
+    try:
+        return pc.cast(to_strings(values), pa.timestamp("ns"))
+    except pa.ArrowInvalid:
+        return pa.array(pd.to_datetime(pd.Series(values)), type=pa.timestamp("ns"))
+
+
+def to_int16(values):
+    arr = pa.array(values)
+    if pa.types.is_string(arr.type):
+        # Anything that is not a number (e.g. "N/A") becomes null.
+        arr = pc.if_else(pc.utf8_is_numeric(arr), arr, pa.scalar(None, pa.string()))
+    return pc.cast(arr, pa.int16())
+
+
+def rows_to_table(columns, rows, names=COLUMNS):
+    # Builds the typed columns straight from the row lists of a query page,
+    # without the per row dicts of .records.
+    values = dict(zip(columns, zip(*rows))) if rows else {}
+    arrays = []
+    for col in names:
+        column = values.get(col, [None] * len(rows))
+        if col == "date":
+            arrays.append(to_dates(column))
+        elif col in DIMENSIONS:
+            arrays.append(to_strings(column).dictionary_encode())
+        elif col in ("season", "week"):
+            arrays.append(to_int16(column))
+        elif col in SKETCHES:
+            arrays.append(hll.from_exports(column))
+        elif col in DIGESTS:
+            arrays.append(tdigest.from_exports(column))
+        else:
+            arrays.append(pa.array(column, type=MEASURE_TYPES[col]))
+    return pa.Table.from_arrays(arrays, names=list(names))
+
+
+def is_sorted(dates):
+    if len(dates) < 2:
+        return dates.null_count == 0
+    ordered = pc.less_equal(dates.slice(0, len(dates) - 1), dates.slice(1))
+    return dates.null_count == 0 and pc.all(ordered).as_py()
+
+
+def table_to_frame(table):
+    # One contiguous copy in Arrow, after that pandas only holds views on the
+    # numeric buffers, which pa.Table.from_pandas wraps again without copying
+    # (e.g. for the snapshot).
+    table = table.unify_dictionaries().combine_chunks()
+    if "date" in table.column_names and not is_sorted(table.column("date")):
+        # Windows are binary searches on the sorted dates (see windows.py),
+        # sorting in Arrow keeps the pandas columns zero-copy. take copies
+        # every column, so rows that are already sorted (e.g. a mapped shared
+        # file) skip it.
+        table = table.take(pc.sort_indices(table, [("date", "ascending")]))
+    df = table.to_pandas(
+        split_blocks=True,
+        types_mapper={pa.int16(): pd.Int16Dtype(), pa.binary(): SKETCH_TYPE}.get,
+    )
+    for col in DIMENSIONS:
+        if col in df and not df[col].cat.categories.is_monotonic_increasing:
+            # Same category order as astype("category"), the charts rely on it.
+            df[col] = df[col].cat.reorder_categories(sorted(df[col].cat.categories))
+    return normalize(df)
+
+
+def decode_pages(tables):
+    return table_to_frame(pa.concat_tables(tables))
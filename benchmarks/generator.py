@@ -0,0 +1,180 @@
+import numpy as np
+import pandas as pd
+
+from hll import PRECISION, SKETCH_DTYPE, SKETCHES, from_buffers, to_export
+from schema import COLUMNS, DIMENSIONS, normalize
+from tdigest import DIGEST_DTYPE, DIGESTS
+from tdigest import to_export as digest_to_export
+
+TEAMS = [
+    "Arizona Cardinals",
+    "Atlanta Falcons",
+    "Baltimore Ravens",
+    "Buffalo Bills",
+    "Carolina Panthers",
+    "Chicago Bears",
+    "Cincinnati Bengals",
+    "Cleveland Browns",
+    "Dallas Cowboys",
+    "Denver Broncos",
+    "Detroit Lions",
+    "Green Bay Packers",
+    "Houston Texans",
+    "Indianapolis Colts",
+    "Jacksonville Jaguars",
+    "Kansas City Chiefs",
+    "Las Vegas Raiders",
+    "Los Angeles Chargers",
+    "Los Angeles Rams",
+    "Miami Dolphins",
+    "Minnesota Vikings",
+    "New England Patriots",
+    "New Orleans Saints",
+    "New York Giants",
+    "New York Jets",
+    "Philadelphia Eagles",
+    "Pittsburgh Steelers",
+    "San Francisco 49ers",
+    "Seattle Seahawks",
+    "Tampa Bay Buccaneers",
+    "Tennessee Titans",
+    "Washington Commanders",
+]
+TIERS = ["COMMON", "RARE", "LEGENDARY", "ULTIMATE"]
+TIER_WEIGHTS = [0.78, 0.17, 0.045, 0.005]
+TIER_PRICES = [3.0, 4.5, 6.5, 8.5]
+PLAY_TYPES = [
+    "Pass",
+    "Rush",
+    "Reception",
+    "Interception",
+    "Sack",
+    "Fumble Recovery",
+    "Player Melt",
+    "Pressure",
+    "Strip Sack",
+    "Kick Return",
+    "Punt Return",
+    "Blocked Kick",
+    "2-Pt Attempt",
+    "Team Melt",
+]
+POSITIONS = ["QB", "WR", "RB", "TE", "OL", "DL", "LB", "DB", "K", "N/A"]
+SEASONS = np.arange(1960, 2023)
+PLAYERS = 1500
+START_DATE = "2022-07-31"
+DAYS = 120
+WALLETS = 20_000
+
+
+def zipf_weights(n, a=1.1):
+    weights = 1 / np.arange(1, n + 1) ** a
+    return weights / weights.sum()
+
+
+def from_codes(codes, categories):
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def hash_wallets(wallets):
+    # splitmix64, the top bits pick the register and the rank is the position
+    # of the first set bit in the rest, like HLL_ACCUMULATE does with its hash.
+    x = wallets.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    x ^= x >> np.uint64(31)
+    bits = 64 - PRECISION
+    rest = x & np.uint64((1 << bits) - 1)
+    # frexp gives the bit length, exact below 2^53.
+    rank = bits + 1 - np.frexp(rest.astype(np.float64))[1]
+    return (x >> np.uint64(bits)).astype("u2"), rank.astype("u1")
+
+
+def generate_sketches(counts, rng):
+    # One sketch of counts[i] wallets per row, a few wallets trade a lot.
+    wallets = rng.choice(WALLETS, counts.sum(), p=zipf_weights(WALLETS, 0.8))
+    entries = np.empty(len(wallets), SKETCH_DTYPE)
+    entries["index"], entries["rank"] = hash_wallets(wallets)
+    offsets = np.concatenate([[0], np.cumsum(counts)]) * SKETCH_DTYPE.itemsize
+    return from_buffers(offsets, entries.view(np.uint8))
+
+
+def generate_prices(avg_prices, counts, rng):
+    # The prices of each row's sales scattered around its price, and their
+    # digest, one centroid per sale like APPROX_PERCENTILE_ACCUMULATE keeps for
+    # a handful of values.
+    rows = np.repeat(np.arange(len(counts)), counts)
+    prices = np.repeat(avg_prices, counts) * rng.lognormal(0, 0.3, len(rows))
+    entries = np.empty(len(prices), DIGEST_DTYPE)
+    entries["mean"] = prices[np.lexsort((prices, rows))]
+    entries["weight"] = 1
+    offsets = np.concatenate([[0], np.cumsum(counts)]) * DIGEST_DTYPE.itemsize
+    totals = np.bincount(rows, weights=prices, minlength=len(counts))
+    return totals, from_buffers(offsets, entries.view(np.uint8))
+
+
+def generate_sales(rows=100_000, seed=0):
+    # Same columns and dtypes as load_data, one row per 8 dimension group.
+    rng = np.random.default_rng(seed)
+    players = ["N/A"] + [f"Player {i:04d}" for i in range(1, PLAYERS)]
+
+    # Sales cluster around the weekend games, most seasons sold are recent.
+    dates = pd.date_range(START_DATE, periods=DAYS, freq="D")
+    day_weights = np.where(dates.dayofweek.isin([3, 4, 5, 6, 0]), 2.5, 1.0)
+    season_weights = np.exp((SEASONS - SEASONS[-1]) / 3)
+
+    tier = rng.choice(len(TIERS), rows, p=TIER_WEIGHTS)
+    sales = rng.geometric(0.35, rows).astype("int32")
+    avg_price = rng.lognormal(np.take(TIER_PRICES, tier), 0.8).astype("float32")
+
+    df = pd.DataFrame(
+        dict(
+            date=dates.values[
+                rng.choice(DAYS, rows, p=day_weights / day_weights.sum())
+            ],
+            moment_tier=from_codes(tier, TIERS),
+            player=from_codes(
+                rng.choice(PLAYERS, rows, p=zipf_weights(PLAYERS)), players
+            ),
+            team=from_codes(
+                rng.choice(len(TEAMS), rows, p=zipf_weights(len(TEAMS), 0.6)), TEAMS
+            ),
+            season=pd.array(
+                rng.choice(SEASONS, rows, p=season_weights / season_weights.sum()),
+                dtype="Int16",
+            ),
+            week=pd.array(rng.integers(1, 23, rows), dtype="Int16"),
+            play_type=from_codes(
+                rng.choice(len(PLAY_TYPES), rows, p=zipf_weights(len(PLAY_TYPES))),
+                PLAY_TYPES,
+            ),
+            player_position=from_codes(
+                rng.choice(len(POSITIONS), rows, p=zipf_weights(len(POSITIONS), 0.8)),
+                POSITIONS,
+            ),
+            sellers=np.minimum(sales, rng.geometric(0.4, rows)).astype("int32"),
+            buyers=np.minimum(sales, rng.geometric(0.4, rows)).astype("int32"),
+            sales=sales,
+            price_count=sales,
+        )
+    )
+    for col, count_col in (("buyers_hll", "buyers"), ("sellers_hll", "sellers")):
+        df[col] = generate_sketches(df[count_col].to_numpy(), rng)
+    totals, df["price_digest"] = generate_prices(avg_price, sales, rng)
+    df["total"] = totals.astype("float32")
+    df["avg_price"] = (totals / sales).astype("float32")
+    df = normalize(df[COLUMNS])
+    df.attrs["version"] = f"synthetic-{rows}-{seed}"
+    return df
+
+
+def generate_records(rows=100_000, seed=0):
+    # The list of dicts ShroomDK hands back for the same data.
+    df = generate_sales(rows, seed)[COLUMNS]
+    df = df.astype({col: str for col in DIMENSIONS + ["season", "week"]})
+    for col in SKETCHES:
+        df[col] = [to_export(sketch) for sketch in df[col]]
+    for col in DIGESTS:
+        df[col] = [digest_to_export(digest) for digest in df[col]]
+    df["date"] = df.date.dt.strftime("%Y-%m-%d")
+    return df.to_dict("records")
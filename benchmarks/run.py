@@ -0,0 +1,211 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import warnings
+from datetime import datetime
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from benchmarks.generator import generate_sales
+from daily_trends import get_daily_team_fig, get_daily_trends
+from figpayload import compact_figure, get_payload_bytes
+from leaderboard import build_leaderboards
+from myutils import (
+    format_currency,
+    get_non_weekends,
+    get_weekends,
+    human_format,
+    human_format_single,
+)
+from player_trends import (
+    get_fig_moment_player_position,
+    get_fig_moment_playtype,
+    get_fig_player_seasons,
+    get_fig_player_seasons_price,
+)
+from rollups import Rollup
+from seasonal_trends import get_fig_moment_season, get_fig_week_season
+from team_trends import get_fig_moment, get_fig_team_season, get_fig_team_season_total
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+# The app's template, it is part of the payload.
+pio.templates.default = "plotly_dark"
+
+
+# Each benchmark takes the generated frame and returns the call to time.
+def builder(fn):
+    # Builders get the raw frame, so every run pays for its own aggregation.
+    return lambda df: partial(fn, df, "bench")
+
+
+def on_daily_sum(fn):
+    return lambda df: partial(fn, Rollup(df).get("date"))
+
+
+def bench_grain(estimates):
+    # One grain from the rows, with the sketches its estimates need merged.
+    return lambda df: lambda: Rollup(df).get("team", "moment_tier", estimates=estimates)
+
+
+def bench_leaderboard_top(df):
+    # A top 50 from the built leaderboard, what a rerun pays once it exists.
+    board = build_leaderboards(df)["player"]
+    return partial(board.top, 50, "total", (str(df.date.iloc[len(df) // 2]), None))
+
+
+def bench_human_format(df):
+    values = df.total.to_numpy(dtype="float64")[:10_000]
+    return lambda: human_format(values.tolist())
+
+
+def bench_format_currency(df):
+    values = df.total.to_numpy(dtype="float64")
+    return partial(format_currency, values)
+
+
+def bench_human_format_single(df):
+    return partial(human_format_single, float(df.total.sum()))
+
+
+BENCHMARKS = {
+    "daily_trends.get_daily_trends": on_daily_sum(get_daily_trends),
+    "daily_trends.get_daily_team_fig": lambda df: partial(get_daily_team_fig, df),
+    "team_trends.get_fig_moment": builder(get_fig_moment),
+    "team_trends.get_fig_team_season": builder(get_fig_team_season),
+    "team_trends.get_fig_team_season_total": builder(get_fig_team_season_total),
+    "player_trends.get_fig_player_seasons": builder(get_fig_player_seasons),
+    "player_trends.get_fig_player_seasons_price": builder(get_fig_player_seasons_price),
+    "player_trends.get_fig_moment_playtype": builder(get_fig_moment_playtype),
+    "player_trends.get_fig_moment_player_position": builder(
+        get_fig_moment_player_position
+    ),
+    "seasonal_trends.get_fig_moment_season": builder(get_fig_moment_season),
+    "seasonal_trends.get_fig_week_season": builder(get_fig_week_season),
+    "rollups.get": bench_grain([]),
+    "rollups.get_unique_counts": bench_grain(["unique_buyers", "unique_sellers"]),
+    "rollups.get_quantiles": bench_grain(["median_price", "p95_price"]),
+    "leaderboard.build_leaderboards": lambda df: partial(build_leaderboards, df),
+    "leaderboard.top": bench_leaderboard_top,
+    "myutils.get_weekends": on_daily_sum(get_weekends),
+    "myutils.get_non_weekends": on_daily_sum(get_non_weekends),
+    "myutils.human_format": bench_human_format,
+    "myutils.human_format_single": bench_human_format_single,
+    "myutils.format_currency": bench_format_currency,
+}
+
+
+def time_it(fn, repeat):
+    value = fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings, value
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(rows_list, repeat, names, seed=0):
+    results = []
+    for rows in rows_list:
+        df = generate_sales(rows, seed)
+        for name in names:
+            timings, value = time_it(BENCHMARKS[name](df), repeat)
+            result = dict(
+                name=name,
+                rows=rows,
+                repeat=repeat,
+                min_ms=min(timings),
+                median_ms=statistics.median(timings),
+                mean_ms=statistics.mean(timings),
+            )
+            payload = ""
+            if isinstance(value, go.Figure):
+                # What the app sends, and the exported figure with typed arrays.
+                fig = compact_figure(value)
+                result["payload_bytes"] = get_payload_bytes(fig)
+                result["typed_payload_bytes"] = get_payload_bytes(fig, True)
+                payload = f" {result['payload_bytes'] / 1024:>10.1f} KiB"
+            results.append(result)
+            print(f"{name:<50} {rows:>10,} rows {min(timings):>10.2f} ms{payload}")
+    return dict(
+        meta=dict(
+            commit=get_git_commit(),
+            created_at=datetime.utcnow().isoformat(),
+            python=platform.python_version(),
+            pandas=pd.__version__,
+            numpy=np.__version__,
+            seed=seed,
+        ),
+        results=results,
+    )
+
+
+def compare(report, baseline, threshold):
+    # Medians that got slower than threshold x the baseline count as regressions.
+    previous = {(r["name"], r["rows"]): r for r in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        before = previous.get((result["name"], result["rows"]))
+        if before and result["median_ms"] > before["median_ms"] * threshold:
+            regressions.append((result, before))
+    for result, before in regressions:
+        print(
+            f"REGRESSION {result['name']} at {result['rows']:,} rows: "
+            f"{before['median_ms']:.2f} ms -> {result['median_ms']:.2f} ms"
+        )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the builders")
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="+", default=list(BENCHMARKS))
+    parser.add_argument("--output", help="defaults to benchmarks/results/<time>.json")
+    parser.add_argument("--compare", help="earlier results file to compare with")
+    parser.add_argument("--threshold", type=float, default=1.2)
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings("ignore", category=FutureWarning)
+    report = run(args.rows, args.repeat, args.only)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, datetime.utcnow().strftime("%Y%m%dT%H%M%S") + ".json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(report, json.load(f), args.threshold):
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from benchmarks.run import get_git_commit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# Runs the script the way `streamlit run` does, without a server (widgets
+# keep their defaults, so the first tab is rendered).
+APP_RUNNER = "import runpy; runpy.run_path('app.py', run_name='__main__')"
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def parse_import_tree(lines):
+    # -X importtime writes a line per module once its import finished, so
+    # the children of a module come before it, one level deeper.
+    stack = []
+    for line in lines:
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        node = dict(
+            name=name,
+            self_ms=int(self_us) / 1000,
+            cumulative_ms=int(cumulative_us) / 1000,
+            children=[],
+        )
+        depth = len(indent) // 2
+        while stack and stack[-1][0] > depth:
+            node["children"].insert(0, stack.pop()[1])
+        stack.append((depth, node))
+    return [node for _, node in stack]
+
+
+def print_tree(nodes, min_ms, max_depth, depth=0):
+    for node in sorted(nodes, key=lambda node: -node["cumulative_ms"]):
+        if node["cumulative_ms"] < min_ms:
+            continue
+        print(f"{node['cumulative_ms']:>10.1f} ms  {'  ' * depth}{node['name']}")
+        if depth + 1 < max_depth:
+            print_tree(node["children"], min_ms, max_depth, depth + 1)
+
+
+def profile_once():
+    # PERF_LOG timings carry wall clock timestamps, the first chart is the
+    # end of the first plotly_chart stage.
+    env = dict(os.environ, PERF_LOG="1")
+    started = time.time()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", APP_RUNNER],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    finished = time.time()
+    lines = process.stderr.splitlines()
+    if process.returncode:
+        sys.stderr.write(process.stderr[-2000:])
+        raise RuntimeError(f"app exited with {process.returncode}")
+    timings = []
+    for line in lines:
+        if line.startswith("{"):
+            try:
+                timings.append(json.loads(line))
+            except ValueError:
+                pass
+    charts = [timing["ts"] for timing in timings if timing["stage"] == "plotly_chart"]
+    tree = parse_import_tree(lines)
+    return dict(
+        import_ms=sum(node["cumulative_ms"] for node in tree),
+        first_chart_ms=(min(charts) - started) * 1000 if charts else None,
+        total_ms=(finished - started) * 1000,
+        tree=tree,
+    )
+
+
+def run(repeat):
+    profiles = [profile_once() for _ in range(repeat)]
+    metrics = {}
+    for metric in ("import_ms", "first_chart_ms", "total_ms"):
+        values = [
+            profile[metric] for profile in profiles if profile[metric] is not None
+        ]
+        metrics[metric] = statistics.median(values) if values else None
+    return dict(
+        meta=dict(
+            commit=get_git_commit(),
+            created_at=datetime.utcnow().isoformat(),
+            python=sys.version.split()[0],
+            repeat=repeat,
+        ),
+        metrics=metrics,
+        # The tree of the run closest to the median first chart.
+        tree=min(
+            profiles,
+            key=lambda profile: abs(
+                (profile["first_chart_ms"] or 0) - (metrics["first_chart_ms"] or 0)
+            ),
+        )["tree"],
+    )
+
+
+def compare(report, baseline, threshold):
+    regressions = []
+    for metric, value in report["metrics"].items():
+        before = baseline["metrics"].get(metric)
+        if value is not None and before and value > before * threshold:
+            regressions.append(metric)
+            print(f"REGRESSION {metric}: {before:.1f} ms -> {value:.1f} ms")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Import time tree and time to the first chart of a cold start"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--min-ms", type=float, default=5.0)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument(
+        "--output", help="defaults to benchmarks/results/startup-<time>.json"
+    )
+    parser.add_argument("--compare", help="earlier startup results to compare with")
+    parser.add_argument("--threshold", type=float, default=1.2)
+    args = parser.parse_args(argv)
+
+    report = run(args.repeat)
+    print_tree(report["tree"], args.min_ms, args.depth)
+    for metric, value in report["metrics"].items():
+        shown = "n/a" if value is None else f"{value:.1f} ms"
+        print(f"{metric:<20} {shown:>12}")
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, datetime.utcnow().strftime("startup-%Y%m%dT%H%M%S") + ".json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(report, json.load(f), args.threshold):
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
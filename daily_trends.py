@@ -1,27 +1,14 @@
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import plotly.io as pio
-
-pio.templates.default = "plotly_dark"
+import pandas as pd
 
+from nflcalendar import load_calendar
+from rollups import add_group_total, as_rollup, grain, lump_other
 
-def get_daily_trends(df_sum):
-    fig = make_subplots(specs=[[{"secondary_y": True}]])
-
-    fig.add_trace(
-        go.Bar(x=df_sum["date"], y=df_sum["total"], name="Daily Sales Volume(USD)"),
-        secondary_y=False,
-    )
-    fig.add_trace(
-        go.Scatter(x=df_sum.date, y=df_sum.sales, name="Number of Daily Sales"),
-        secondary_y=True,
-    )
-    fig.add_vrect(
-        x0="2022-08-04",
-        x1="2022-08-07",
-        annotation_text="Hall of Fame Weekend",
+PRESEASON_WINDOWS = ["hall_of_fame", "preseason_weekend"]
+VRECT_STYLES = {
+    "hall_of_fame": dict(
         annotation_position="inside top right",
         annotation_textangle=90,
         annotation_font_size=16,
@@ -31,35 +18,8 @@ def get_daily_trends(df_sum):
         opacity=0.25,
         line_width=2,
         line_dash="solid",
-    )
-
-    fig.add_vline(
-        x="2022-08-04",
-        line_color="white",
-        line_width=2,
-        line_dash="dash",
-    )
-    fig.add_annotation(
-        x="2022-08-04",
-        y=395000,
-        text=f"Preseason start",
-        yanchor="top",
-        showarrow=True,
-        arrowhead=1,
-        arrowsize=1,
-        arrowwidth=2,
-        arrowcolor="#636363",
-        font=dict(size=16, color="green", family="Courier New, monospace, bold"),
-        bordercolor="green",
-        borderwidth=2,
-        bgcolor="#CFECEC",
-        opacity=0.6,
-    )
-
-    fig.add_vrect(
-        x0="2022-08-11",
-        x1="2022-08-14",
-        annotation_text="First Preseason Weekend",
+    ),
+    "preseason_weekend": dict(
         annotation_position="inside top left",
         annotation_textangle=90,
         annotation_font_size=16,
@@ -68,58 +28,54 @@ def get_daily_trends(df_sum):
         opacity=0.3,
         line_width=0,
         line_dash="dash",
-    )
+    ),
+}
 
-    fig.add_vrect(
-        x0="2022-08-18",
-        x1="2022-08-22",
-        annotation_text="Second Preseason Weekend",
-        annotation_position="inside top left",
-        annotation_textangle=90,
-        annotation_font_size=16,
-        annotation_font_color="gray",
-        fillcolor="Green",
-        opacity=0.3,
-        line_color="white",
-        line_width=0,
-        line_dash="dash",
-    )
 
-    fig.add_vrect(
-        x0="2022-08-25",
-        x1="2022-08-28",
-        annotation_text="Third Preseason Weekend",
-        annotation_position="inside top left",
-        annotation_textangle=90,
-        annotation_font_size=16,
-        annotation_font_color="gray",
-        fillcolor="Green",
-        opacity=0.3,
-        line_width=0,
-    )
+@grain("date")
+def get_daily_trends(df_sum):
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
 
-    fig.add_vline(
-        x="2022-08-28",
-        line_color="white",
-        line_width=2,
-        line_dash="dash",
+    fig.add_trace(
+        go.Bar(x=df_sum["date"], y=df_sum["total"], name="Daily Sales Volume(USD)"),
+        secondary_y=False,
     )
-    fig.add_annotation(
-        x="2022-08-28",
-        y=395000,
-        text=f"Preseason end",
-        yanchor="top",
-        showarrow=True,
-        arrowhead=1,
-        arrowsize=1,
-        arrowwidth=2,
-        arrowcolor="#636363",
-        font=dict(size=16, color="green", family="Courier New, monospace, bold"),
-        bordercolor="green",
-        borderwidth=2,
-        bgcolor="#CFECEC",
-        opacity=0.6,
+    fig.add_trace(
+        go.Scatter(x=df_sum.date, y=df_sum.sales, name="Number of Daily Sales"),
+        secondary_y=True,
     )
+    first, last = df_sum.date.min(), df_sum.date.max()
+    if pd.notna(first):
+        calendar = load_calendar()
+        for window in calendar.get_game_windows(PRESEASON_WINDOWS, first, last):
+            fig.add_vrect(
+                x0=window["start"],
+                x1=window["end"],
+                annotation_text=window["name"],
+                **VRECT_STYLES[window["kind"]],
+            )
+        for window in calendar.get_phases("Preseason", first, last):
+            for x, text in [(window["start"], "start"), (window["end"], "end")]:
+                fig.add_vline(x=x, line_color="white", line_width=2, line_dash="dash")
+                fig.add_annotation(
+                    x=x,
+                    y=395000,
+                    text=f"Preseason {text}",
+                    yanchor="top",
+                    showarrow=True,
+                    arrowhead=1,
+                    arrowsize=1,
+                    arrowwidth=2,
+                    arrowcolor="#636363",
+                    font=dict(
+                        size=16, color="green", family="Courier New, monospace, bold"
+                    ),
+                    bordercolor="green",
+                    borderwidth=2,
+                    bgcolor="#CFECEC",
+                    opacity=0.6,
+                )
+
     fig.update_xaxes(title="Date")
     fig.update_yaxes(title="Number of Sales", secondary_y=True)
     fig.update_yaxes(title="Sales Volume (USD)", secondary_y=False)
@@ -129,10 +85,19 @@ def get_daily_trends(df_sum):
     return fig
 
 
+@grain("team", "date")
 def get_daily_team_fig(df_daily_sales):
-    df_team = df_daily_sales.groupby(["team", "date"]).sum().reset_index()
-    df_team = pd.merge(df_team, df_team.groupby("date").sum().reset_index(), on="date")
-    df_team["perc"] = df_team.total_x * 100 / df_team.total_y
+    # Traces beyond the budget are summed into "Other".
+    df_team = add_group_total(
+        lump_other(
+            as_rollup(df_daily_sales).get("team", "date"),
+            "team",
+            ["team", "date"],
+            ["total"],
+        ),
+        "date",
+    )
+    df_team["perc"] = df_team.total * 100 / df_team.date_total
     fig_team_perc = px.area(
         df_team,
         x="date",
@@ -140,59 +105,31 @@ def get_daily_team_fig(df_daily_sales):
         color="team",
         labels=dict(perc="Percentage (%)", date="Date"),
     )
-
-    fig_team_perc.add_vrect(
-        x0="2022-08-04",
-        x1="2022-08-07",
-        annotation_text="Hall of Fame Weekend",
-        annotation_position="inside top left",  # annotation_textangle = 90,
-        annotation_font_size=14,
-        annotation_font_color="white",
-        # fillcolor="yellow",
-        line_color="white",
-        opacity=1,
-        line_width=2,
-        line_dash="dash",
-    )
-
-    fig_team_perc.add_vrect(
-        x0="2022-08-11",
-        x1="2022-08-14",
-        annotation_text="First Preseason Weekend",
-        annotation_position="inside top left",  # annotation_textangle = 90,
-        annotation_font_size=14,
-        annotation_font_color="white",
-        # fillcolor="Green",
-        opacity=1,
-        line_width=2,
-        line_dash="dash",
-    )
-
-    fig_team_perc.add_vrect(
-        x0="2022-08-18",
-        x1="2022-08-22",
-        annotation_text="Second Preseason Weekend",
-        annotation_position="inside top left",  # annotation_textangle = 90,
-        annotation_font_size=14,
-        annotation_font_color="white",
-        # fillcolor="Green",
-        opacity=1,
-        line_color="white",
-        line_width=2,
-        line_dash="dash",
-    )
-
-    fig_team_perc.add_vrect(
-        x0="2022-08-25",
-        x1="2022-08-28",
-        annotation_text="Third Preseason Weekend",
-        annotation_position="inside top left",  # annotation_textangle = 90,
-        annotation_font_size=14,
-        annotation_font_color="white",
-        # fillcolor="Green",
-        opacity=1,
-        line_width=2,
-        line_dash="dash",
-    )
+    fig_team_perc.update_traces(
+        hovertemplate="<br>".join(
+            [
+                "Team: %{fullData.name}",
+                "Date: %{x}",
+                # Formatted in the browser, not as a string per point.
+                "Share: %{y:.1f}%<extra></extra>",
+            ]
+        )
+    )
+
+    first, last = df_team.date.min(), df_team.date.max()
+    if pd.notna(first):
+        for window in load_calendar().get_game_windows(PRESEASON_WINDOWS, first, last):
+            fig_team_perc.add_vrect(
+                x0=window["start"],
+                x1=window["end"],
+                annotation_text=window["name"],
+                annotation_position="inside top left",
+                annotation_font_size=14,
+                annotation_font_color="white",
+                line_color="white",
+                opacity=1,
+                line_width=2,
+                line_dash="dash",
+            )
 
     return fig_team_perc
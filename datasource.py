@@ -0,0 +1,186 @@
+import gzip
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+DATA_SOURCE = os.getenv("DATA_SOURCE", "shroomdk")
+RECORDINGS_DIR = os.getenv("RECORDINGS_DIR", "recordings")
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", 100000))
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", 4))
+
+
+class QueryResult:
+    def __init__(self, columns, rows, total_rows=None):
+        # ShroomDK lower cases the column names of its records.
+        self.columns = [col.lower() for col in columns]
+        self.rows = rows
+        self.total_rows = total_rows
+
+    @property
+    def records(self):
+        return [dict(zip(self.columns, row)) for row in self.rows]
+
+
+class ShroomDKSource:
+    def __init__(self, api_key):
+        from shroomdk import ShroomDK
+
+        self.sdk = ShroomDK(api_key)
+
+    def query(self, sql, page_size=PAGE_SIZE, page_number=1):
+        result = self.sdk.query(sql, page_size=page_size, page_number=page_number)
+        run_stats = getattr(result, "run_stats", None)
+        return QueryResult(
+            result.columns or [],
+            result.rows or [],
+            getattr(run_stats, "record_count", None),
+        )
+
+
+def get_recording_path(root, sql):
+    # Whitespace only differences (indentation of the f-strings) share a file.
+    key = hashlib.sha256(" ".join(sql.split()).encode()).hexdigest()[:16]
+    return os.path.join(root, f"{key}.json.gz")
+
+
+def get_page(result, page_size, page_number):
+    start = (page_number - 1) * page_size
+    return QueryResult(
+        result.columns, result.rows[start : start + page_size], len(result.rows)
+    )
+
+
+def has_more_pages(first_page, page, fetched_rows):
+    # The backend may serve smaller pages than asked for, so a page only
+    # counts as short compared to the first one.
+    if first_page.total_rows is not None:
+        return fetched_rows < first_page.total_rows
+    return len(page.rows) > 0 and len(page.rows) == len(first_page.rows)
+
+
+def fetch_all(source, sql, page_size=PAGE_SIZE):
+    first_page = page = source.query(sql, page_size=page_size, page_number=1)
+    rows = list(page.rows)
+    page_number = 1
+    while has_more_pages(first_page, page, len(rows)):
+        page_number += 1
+        page = source.query(sql, page_size=page_size, page_number=page_number)
+        rows.extend(page.rows)
+    return QueryResult(first_page.columns, rows, len(rows))
+
+
+def fetch_pages(source, sql, decode, page_size=PAGE_SIZE, max_workers=FETCH_WORKERS):
+    # Pages are decoded by decode(columns, rows) on the worker as soon as they
+    # arrive and come back in page order, the rows are never collected whole.
+    first_page = source.query(sql, page_size=page_size, page_number=1)
+    chunks = {1: decode(first_page.columns, first_page.rows)}
+    served = len(first_page.rows)
+    if not served or not has_more_pages(first_page, first_page, served):
+        return [chunks[1]]
+
+    def fetch(page_number):
+        page = source.query(sql, page_size=page_size, page_number=page_number)
+        return page_number, len(page.rows), decode(page.columns, page.rows)
+
+    last_page = None
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        if first_page.total_rows is not None:
+            last_page = math.ceil(first_page.total_rows / served)
+            for page_number, _, chunk in pool.map(fetch, range(2, last_page + 1)):
+                chunks[page_number] = chunk
+        else:
+            # Without a row count keep max_workers pages in flight until the
+            # first short page shows where the result ends.
+            next_page, pending = 2, set()
+            while pending or last_page is None:
+                while last_page is None and len(pending) < max_workers:
+                    pending.add(pool.submit(fetch, next_page))
+                    next_page += 1
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    page_number, size, chunk = future.result()
+                    chunks[page_number] = chunk
+                    if size < served and (last_page is None or page_number < last_page):
+                        last_page = page_number
+    return [chunks[n] for n in sorted(chunks) if n <= last_page]
+
+
+class RecordingSource:
+    def __init__(self, source, root=RECORDINGS_DIR):
+        self.source = source
+        self.root = root
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def query(self, sql, page_size=PAGE_SIZE, page_number=1):
+        # The whole result is recorded on the first page, replays can then be
+        # paged with any page size.
+        with self._lock:
+            if sql not in self._results:
+                result = fetch_all(self.source, sql, page_size)
+                self.save(sql, result)
+                self._results[sql] = result
+        return get_page(self._results[sql], page_size, page_number)
+
+    def save(self, sql, result):
+        os.makedirs(self.root, exist_ok=True)
+        path = get_recording_path(self.root, sql)
+        with gzip.open(path + ".tmp", "wt") as f:
+            json.dump(dict(sql=sql, columns=result.columns, rows=result.rows), f)
+        os.replace(path + ".tmp", path)
+
+
+class ReplaySource:
+    def __init__(
+        self, root=RECORDINGS_DIR, latency=0.0, jitter=0.0, page_size=None, seed=0
+    ):
+        self.root = root
+        self.latency = latency
+        self.jitter = jitter
+        self.page_size = page_size
+        self._random = random.Random(seed)
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def load(self, sql):
+        with self._lock:
+            if sql not in self._results:
+                path = get_recording_path(self.root, sql)
+                if not os.path.exists(path):
+                    raise LookupError(f"No recording of this query in {self.root}")
+                with gzip.open(path, "rt") as f:
+                    recording = json.load(f)
+                self._results[sql] = QueryResult(
+                    recording["columns"], recording["rows"]
+                )
+            return self._results[sql]
+
+    def query(self, sql, page_size=PAGE_SIZE, page_number=1):
+        result = self.load(sql)
+        with self._lock:
+            delay = self.latency + self._random.uniform(0, self.jitter)
+        time.sleep(delay)
+        # A forced page size makes the caller see the shorter pages a real
+        # backend would return.
+        return get_page(
+            result, min(page_size, self.page_size or page_size), page_number
+        )
+
+
+def get_source(kind=DATA_SOURCE):
+    if kind == "shroomdk":
+        return ShroomDKSource(os.getenv("API_KEY"))
+    if kind == "record":
+        return RecordingSource(ShroomDKSource(os.getenv("API_KEY")))
+    if kind == "replay":
+        return ReplaySource(
+            latency=float(os.getenv("REPLAY_LATENCY", 0)),
+            jitter=float(os.getenv("REPLAY_JITTER", 0)),
+            page_size=int(os.getenv("REPLAY_PAGE_SIZE", 0)) or None,
+        )
+    raise ValueError(f"Unknown DATA_SOURCE {kind!r}")
@@ -0,0 +1,61 @@
+import os
+import threading
+from collections import OrderedDict
+
+from figpayload import compact_figure, get_payload_bytes
+from perf import count, timed
+
+FIGURE_CACHE_SIZE = int(os.getenv("FIGURE_CACHE_SIZE", 64))
+FIGURE_CACHE_MB = int(os.getenv("FIGURE_CACHE_MB", 64))
+
+
+class FigureCache:
+    def __init__(self, max_items=FIGURE_CACHE_SIZE, max_bytes=FIGURE_CACHE_MB * 2**20):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, builder, args, version):
+        key = (builder.__module__, builder.__qualname__, args[1:], version)
+        with self._lock:
+            if key in self._figures:
+                self._figures.move_to_end(key)
+                count("figure_cache.hit")
+                return self._figures[key][0]
+        count("figure_cache.miss")
+
+        name = f"{key[0]}.{key[1]}"
+        with timed("build", figure=name):
+            fig = builder(*args)
+        with timed("compact", figure=name) as fields:
+            fig = compact_figure(fig)
+            # The serialized size is what the figure costs to keep around and
+            # what every session downloads, the perf panel shows it.
+            size = fields["bytes"] = get_payload_bytes(fig)
+        with self._lock:
+            if key not in self._figures:
+                self._figures[key] = (fig, size)
+                self.nbytes += size
+            while self._figures and (
+                len(self._figures) > self.max_items or self.nbytes > self.max_bytes
+            ):
+                _, (_, evicted) = self._figures.popitem(last=False)
+                self.nbytes -= evicted
+        return fig
+
+    def clear(self):
+        with self._lock:
+            self._figures.clear()
+            self.nbytes = 0
+
+
+figure_cache = FigureCache()
+
+
+def cached_figure(builder, *args, version=None):
+    # The first argument is the data, it is identified by the version instead.
+    if version is None:
+        return compact_figure(builder(*args))
+    return figure_cache.get_or_build(builder, args, version)
@@ -0,0 +1,186 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.json
+
+# HLL_ACCUMULATE in Snowflake keeps 2^12 registers, about 1.6% standard error.
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+# A sketch is stored sparse, one (register, value) entry per non-empty
+# register, so a group with a handful of wallets costs a few bytes.
+SKETCH_DTYPE = np.dtype([("index", "<u2"), ("rank", "u1")])
+# Sketch column -> the estimate rollups add for it.
+SKETCHES = {"buyers_hll": "unique_buyers", "sellers_hll": "unique_sellers"}
+# Arrow backed, so merging reads the offsets and bytes of a whole column
+# without touching the rows one by one (and a mapped file stays mapped).
+SKETCH_TYPE = pd.ArrowDtype(pa.binary())
+# The HLL_EXPORT fields the sketches are decoded from.
+EXPORT_TYPE = pa.struct(
+    [
+        ("precision", pa.int64()),
+        (
+            "sparse",
+            pa.struct(
+                [
+                    ("indices", pa.list_(pa.int64())),
+                    ("maxLzCounts", pa.list_(pa.int64())),
+                ]
+            ),
+        ),
+        ("dense", pa.list_(pa.int64())),
+    ]
+)
+
+
+def to_structs(values, type):
+    # Export objects (dicts or their JSON) as one struct array. Arrow converts
+    # the nested lists and parses the JSON for the whole column, instead of a
+    # json.loads and a numpy array per row. Missing fields are null.
+    values = [value or None for value in values]
+    if not any(isinstance(value, (str, bytes)) for value in values):
+        return pa.array(values, type=type)
+    table = pyarrow.json.read_json(
+        io.BytesIO(b"\n".join(to_json(value) for value in values)),
+        parse_options=pyarrow.json.ParseOptions(
+            explicit_schema=pa.schema(list(type)),
+            unexpected_field_behavior="ignore",
+            newlines_in_values=True,
+        ),
+    )
+    return pa.StructArray.from_arrays(
+        [column.combine_chunks() for column in table.columns], fields=list(type)
+    )
+
+
+def to_json(value):
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return value.encode()
+    return json.dumps(value or {}).encode()
+
+
+def get_lists(array):
+    # The values of a list array in one numpy array and the number per row,
+    # 0 for a null.
+    lengths = pc.list_value_length(array).fill_null(0).to_numpy()
+    values = pc.list_flatten(array).to_numpy(zero_copy_only=False)
+    return values, lengths.astype(np.int64)
+
+
+def from_exports(values):
+    # HLL_EXPORT objects are either {"sparse": {"indices", "maxLzCounts"}} or
+    # {"dense": [...]} with a value per register, 0 for an empty one. The
+    # sketches of a whole column are decoded at once, as a binary array.
+    precision, sparse, dense = to_structs(values, EXPORT_TYPE).flatten()
+    unsupported = pc.filter(precision, pc.not_equal(precision, PRECISION))
+    if len(unsupported):
+        raise ValueError(f"Unsupported HLL precision {unsupported[0].as_py()}")
+    rows = np.arange(len(precision))
+    indices, ranks = sparse.flatten()
+    indices, sizes = get_lists(indices)
+    ranks, _ = get_lists(ranks)
+    sparse_rows = np.repeat(rows, sizes)
+
+    # The filled registers of the dense rows, a sparse sketch wins.
+    registers, sizes = get_lists(dense)
+    dense_rows = np.repeat(rows, sizes)
+    positions = np.arange(len(registers)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    has_sparse = sparse.is_valid().to_numpy(zero_copy_only=False)
+    filled = (registers != 0) & ~has_sparse[dense_rows]
+
+    entry_rows = np.concatenate([sparse_rows, dense_rows[filled]])
+    order = np.argsort(entry_rows, kind="stable")
+    sketch = np.empty(len(order), SKETCH_DTYPE)
+    sketch["index"] = np.concatenate([indices, positions[filled]])[order]
+    sketch["rank"] = np.concatenate([ranks, registers[filled]])[order]
+    counts = np.bincount(entry_rows, minlength=len(rows))
+    offsets = np.concatenate([[0], np.cumsum(counts)]) * SKETCH_DTYPE.itemsize
+    return to_binary(offsets, sketch.view(np.uint8))
+
+
+def to_export(sketch):
+    entries = np.frombuffer(sketch or b"", SKETCH_DTYPE)
+    return dict(
+        version=4,
+        precision=PRECISION,
+        sparse=dict(
+            indices=entries["index"].tolist(), maxLzCounts=entries["rank"].tolist()
+        ),
+    )
+
+
+def estimate(harmonic_sums, zeros):
+    # HyperLogLog, with linear counting for the small cardinalities most
+    # groups have. harmonic_sums is the sum of 2^-register over all registers.
+    m = REGISTERS
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / harmonic_sums
+    linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+
+def to_binary(offsets, data):
+    return pa.Array.from_buffers(
+        pa.binary(),
+        len(offsets) - 1,
+        [None, pa.py_buffer(offsets.astype(np.int32)), pa.py_buffer(data)],
+    )
+
+
+def from_buffers(offsets, data):
+    return pd.arrays.ArrowExtensionArray(to_binary(offsets, data))
+
+
+def get_entries(sketches, dtype=SKETCH_DTYPE):
+    # The entries of every sketch in one array and the number per sketch.
+    array = pa.array(sketches, type=pa.binary())
+    if isinstance(array, pa.ChunkedArray):
+        array = (
+            array.combine_chunks() if array.num_chunks else pa.array([], pa.binary())
+        )
+    _, offsets, data = array.buffers()
+    offsets = np.frombuffer(offsets, dtype=np.int32)[
+        array.offset : array.offset + len(array) + 1
+    ]
+    if data is None or not len(array):
+        return np.empty(0, dtype), np.zeros(len(array), dtype=np.int64)
+    entries = np.frombuffer(data, dtype=np.uint8)[offsets[0] : offsets[-1]]
+    return entries.view(dtype), np.diff(offsets) // dtype.itemsize
+
+
+def merge_sketches(sketches, groups, n_groups):
+    # Merged sketches and estimates per group, groups are numbered 0..n-1 and
+    # rows in group -1 are left out. A merged register is the max over the
+    # rows of the group, found by sorting the entries instead of expanding
+    # 4096 registers per group.
+    entries, sizes = get_entries(sketches)
+    rows = np.repeat(np.asarray(groups, dtype=np.int64), sizes)
+    valid = rows >= 0
+    # group, register and value in one integer, sorted the last entry of a
+    # register is its max.
+    keys = (rows[valid] << PRECISION) + entries["index"][valid]
+    packed = np.sort((keys << 8) + entries["rank"][valid])
+    keys = packed >> 8
+    last = np.ones(len(keys), dtype=bool)
+    last[:-1] = keys[1:] != keys[:-1]
+    packed = packed[last]
+    keys = packed >> 8
+
+    merged_groups = keys >> PRECISION
+    ranks = (packed & 0xFF).astype(np.uint8)
+    filled = np.bincount(merged_groups, minlength=n_groups)
+    harmonic_sums = np.bincount(
+        merged_groups, weights=np.exp2(-ranks.astype(np.float64)), minlength=n_groups
+    ) + (REGISTERS - filled)
+
+    merged_entries = np.empty(len(packed), SKETCH_DTYPE)
+    merged_entries["index"] = keys & (REGISTERS - 1)
+    merged_entries["rank"] = ranks
+    offsets = np.concatenate([[0], np.cumsum(filled)]) * SKETCH_DTYPE.itemsize
+    merged = from_buffers(offsets, merged_entries.view(np.uint8))
+    return merged, estimate(harmonic_sums, REGISTERS - filled)
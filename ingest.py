@@ -0,0 +1,156 @@
+from datetime import timedelta
+
+import pandas as pd
+
+from leaderboard import find_leaderboards, register_leaderboards, replace_days
+from refresher import REFRESH_AHEAD, Refresher
+from schema import concat_frames
+
+TIMEZONE = "America/New_York"
+SEASON_START = "2022-08-01"
+
+# Days before the watermark that are fetched again on every refresh, so sales
+# that land in the source tables late still make it into closed days.
+LOOKBACK_DAYS = 1
+
+DAILY_SALES_SQL = """
+    select
+        convert_timezone('UTC', 'America/New_York', block_timestamp::timestamp_ntz)::date as date,
+        moment_tier,
+        player,
+        team,
+        season,
+        week,
+        play_type,
+        MOMENT_STATS_FULL:metadata:playerPosition as player_position,
+        avg(price) as avg_price,
+        sum(price) as total,
+        count(distinct seller) as sellers,
+        count(distinct buyer) as buyers,
+        count(distinct tx_id) as sales,
+        count(price) as price_count,
+        approx_percentile_accumulate(price) as price_digest,
+        hll_export(hll_accumulate(buyer)) as buyers_hll,
+        hll_export(hll_accumulate(seller)) as sellers_hll
+    from flow.core.ez_nft_sales s
+        inner join flow.core.dim_allday_metadata m
+            on m.nft_collection=s.nft_collection
+            and m.nft_id=s.nft_id
+    where
+        block_timestamp >= '{since}'
+        and TX_SUCCEEDED='TRUE'
+    group by date, moment_tier, player, team, season, week, play_type, player_position
+    """
+
+
+def get_daily_sales_sql(since=SEASON_START):
+    return DAILY_SALES_SQL.format(since=since)
+
+
+def get_last_closed_date(now=None):
+    now = pd.Timestamp.now(tz=TIMEZONE) if now is None else now.tz_convert(TIMEZONE)
+    return now.tz_localize(None).normalize() - timedelta(days=1)
+
+
+def get_utc_start(date):
+    # block_timestamp is stored in UTC, start the delta at New York midnight.
+    return (
+        pd.Timestamp(date)
+        .tz_localize(TIMEZONE)
+        .tz_convert("UTC")
+        .strftime("%Y-%m-%d %H:%M:%S")
+    )
+
+
+def merge_delta(df, df_delta, first_open_date):
+    if df_delta.empty:
+        return df
+    return concat_frames([df[df.date < first_open_date], df_delta])
+
+
+class IncrementalLoader:
+    def __init__(
+        self,
+        run_query,
+        lookback_days=LOOKBACK_DAYS,
+        on_refresh=None,
+        refresher=None,
+        key="daily_sales",
+    ):
+        self.run_query = run_query
+        self.lookback_days = lookback_days
+        self.on_refresh = on_refresh
+        self.refresher = refresher or Refresher()
+        self.key = key
+        self.df = None
+        self.watermark = None
+        self.refreshed_at = None
+
+    def restore(self, snapshot):
+        if snapshot is None:
+            return False
+        self.df = snapshot["df"]
+        self.watermark = snapshot["watermark"]
+        self.refreshed_at = snapshot["refreshed_at"]
+        self.df.attrs["version"] = self.refreshed_at.isoformat()
+        return True
+
+    def get_age(self):
+        if self.refreshed_at is None:
+            return None
+        return (pd.Timestamp.now(tz="UTC") - self.refreshed_at).total_seconds()
+
+    def is_stale(self, ttl):
+        age = self.get_age()
+        return age is None or age > ttl
+
+    def refresh(self, now=None):
+        now = pd.Timestamp.now(tz="UTC") if now is None else now
+        last_closed = get_last_closed_date(now)
+        first_open_date = None
+        if self.df is None:
+            df = self.run_query(get_daily_sales_sql())
+        else:
+            first_open_date = self.watermark + timedelta(days=1 - self.lookback_days)
+            df_delta = self.run_query(
+                get_daily_sales_sql(since=get_utc_start(first_open_date))
+            )
+            df = merge_delta(self.df, df_delta, first_open_date)
+            # The leaderboards of the rows served so far only need the new days.
+            leaderboards = find_leaderboards(self.df.attrs.get("version"))
+            if leaderboards is not None:
+                register_leaderboards(
+                    now.isoformat(),
+                    replace_days(leaderboards, df_delta, first_open_date),
+                )
+        df.attrs["version"] = now.isoformat()
+        previous = self.refreshed_at
+        self.df, self.watermark, self.refreshed_at = df, last_closed, now
+        if self.on_refresh is not None:
+            # Only the days from first_open_date on differ from the rows of
+            # the previous refresh (all of them after a full load).
+            self.on_refresh(
+                df, last_closed, now, first_open_date=first_open_date, previous=previous
+            )
+        return df
+
+    def update(self):
+        # Concurrent callers share the refresh that is already running.
+        return self.refresher.run(self.key, self.refresh)
+
+    def schedule(self, ttl, ahead=REFRESH_AHEAD):
+        # Refreshes in the background before the data gets stale, a cold
+        # loader starts right away.
+        interval = ttl * ahead
+        age = self.get_age()
+        delay = 0 if age is None else interval - age
+        self.refresher.schedule(self.key, self.refresh, interval, delay)
+
+    def get(self, ttl):
+        # Serve whatever is loaded (e.g. a snapshot) and revalidate behind it,
+        # only a cold start without any data waits for the query.
+        if self.df is None:
+            self.update()
+        elif self.is_stale(ttl):
+            self.refresher.run_in_background(self.key, self.refresh)
+        return self.df
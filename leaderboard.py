@@ -0,0 +1,149 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from windows import get_bounds
+
+# Dimensions that get a leaderboard, and the additive measures it keeps.
+LEADERBOARD_DIMS = ["player", "team", "play_type"]
+LEADERBOARD_MEASURES = ["total", "sales", "price_count"]
+LEADERBOARD_CACHE_SIZE = 4
+# Orders kept per leaderboard, one per window and measure asked for.
+ORDER_CACHE_SIZE = 64
+
+_boards = OrderedDict()
+_boards_lock = threading.Lock()
+
+
+def aggregate_days(df, dim, keys):
+    # Per day and key sums of the measures of the rows (sorted by date).
+    days, day_index = np.unique(df["date"].values, return_inverse=True)
+    key_index = keys.get_indexer(df[dim].cat.categories)[df[dim].cat.codes.to_numpy()]
+    # Rows without a value (code -1) are left out, like in a groupby.
+    valid = df[dim].cat.codes.to_numpy() >= 0
+    cells = day_index[valid] * len(keys) + key_index[valid]
+    sums = {
+        measure: np.bincount(
+            cells,
+            weights=df[measure].to_numpy(dtype=np.float64)[valid],
+            minlength=len(days) * len(keys),
+        ).reshape(len(days), len(keys))
+        for measure in LEADERBOARD_MEASURES
+    }
+    return days, sums
+
+
+class Leaderboard:
+    # Running totals of the measures per key of one dimension over the days,
+    # so the totals of any window are the difference of two rows and a top n
+    # never touches the sales rows. Never changed once built, an update
+    # returns a new one.
+    def __init__(self, dim, keys, days, cumulative):
+        self.dim = dim
+        self.keys = keys
+        self.days = days
+        # measure -> (days + 1, keys), the first row is zeros.
+        self.cumulative = cumulative
+        self._key_ranks = np.argsort(np.argsort(keys.to_numpy(dtype=str)))
+        self._orders = {}
+
+    @classmethod
+    def from_frame(cls, df, dim):
+        keys = pd.Index(df[dim].cat.categories.astype(object))
+        days, sums = aggregate_days(df, dim, keys)
+        return cls(dim, keys, days, get_cumulative(sums, len(keys)))
+
+    def replace_days(self, df_delta, first_date):
+        # The days from first_date on come from df_delta, the earlier ones
+        # stay, like ingest.merge_delta. Costs the new days times the keys.
+        categories = df_delta[self.dim].cat.categories.astype(object)
+        keys = self.keys.append(pd.Index(categories.difference(self.keys)))
+        keep = self.days.searchsorted(np.datetime64(first_date, "ns"), "left")
+        days, sums = aggregate_days(df_delta, self.dim, keys)
+        cumulative = {}
+        for measure, totals in self.cumulative.items():
+            kept = np.zeros((keep + 1, len(keys)))
+            kept[:, : len(self.keys)] = totals[: keep + 1]
+            cumulative[measure] = np.concatenate(
+                [kept, kept[-1] + np.cumsum(sums[measure], axis=0)]
+            )
+        days = np.concatenate([self.days[:keep], days])
+        return Leaderboard(self.dim, keys, days, cumulative)
+
+    def get_totals(self, window=None, index=slice(None)):
+        lo, hi = get_bounds(self.days, window)
+        totals = {
+            measure: cumulative[hi, index] - cumulative[lo, index]
+            for measure, cumulative in self.cumulative.items()
+        }
+        with np.errstate(divide="ignore", invalid="ignore"):
+            totals["avg_price"] = totals["total"] / totals["price_count"]
+        return totals
+
+    def get_order(self, by, window=None):
+        # Every key with sales in the window, largest first and ties by name.
+        # Kept per window, so later calls only read the first n.
+        order = self._orders.get((by, window))
+        if order is None:
+            totals = self.get_totals(window)
+            score = totals[by]
+            ranked = np.flatnonzero((totals["sales"] > 0) & np.isfinite(score))
+            order = ranked[np.lexsort((self._key_ranks[ranked], -score[ranked]))]
+            if len(self._orders) >= ORDER_CACHE_SIZE:
+                self._orders.clear()
+            self._orders[(by, window)] = order
+        return order
+
+    def top(self, n, by="total", window=None):
+        order = self.get_order(by, window)[:n]
+        totals = self.get_totals(window, order)
+        return pd.DataFrame({self.dim: self.keys[order], **totals})
+
+
+def get_cumulative(sums, n_keys):
+    return {
+        measure: np.concatenate([np.zeros((1, n_keys)), np.cumsum(values, axis=0)])
+        for measure, values in sums.items()
+    }
+
+
+def build_leaderboards(df):
+    return {dim: Leaderboard.from_frame(df, dim) for dim in LEADERBOARD_DIMS}
+
+
+def replace_days(leaderboards, df_delta, first_date):
+    if df_delta.empty:
+        return leaderboards
+    return {
+        dim: board.replace_days(df_delta, first_date)
+        for dim, board in leaderboards.items()
+    }
+
+
+def find_leaderboards(version):
+    with _boards_lock:
+        return _boards.get(version)
+
+
+def register_leaderboards(version, leaderboards):
+    with _boards_lock:
+        _boards[version] = leaderboards
+        _boards.move_to_end(version)
+        while len(_boards) > LEADERBOARD_CACHE_SIZE:
+            _boards.popitem(last=False)
+    return leaderboards
+
+
+def get_leaderboards(df):
+    # The leaderboards of a full frame (not a window of it). The loader
+    # registers the ones it updated from a delta, any other version is built
+    # from its rows once.
+    version = df.attrs.get("version")
+    leaderboards = find_leaderboards(version) if version is not None else None
+    if leaderboards is None:
+        leaderboards = build_leaderboards(df)
+        if version is not None:
+            register_leaderboards(version, leaderboards)
+    return leaderboards
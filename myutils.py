@@ -1,79 +1,117 @@
-from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+
+from nflcalendar import load_calendar
+
+UNITS = ["", "K", "M", "G", "T", "P"]
+
+
+def is_game_day(df):
+    if "game_day" in df:
+        return df.game_day.to_numpy(dtype=bool)
+    return load_calendar().is_game_day(df.date)
 
 
 def get_weekends(df_preseason):
-    return df_preseason[
-        df_preseason.date.isin(
-            [
-                datetime(2022, 8, 4),
-                datetime(2022, 8, 5),
-                datetime(2022, 8, 6),
-                datetime(2022, 8, 7),
-                datetime(2022, 8, 11),
-                datetime(2022, 8, 12),
-                datetime(2022, 8, 13),
-                datetime(2022, 8, 14),
-                datetime(2022, 8, 18),
-                datetime(2022, 8, 19),
-                datetime(2022, 8, 20),
-                datetime(2022, 8, 21),
-                datetime(2022, 8, 22),
-                datetime(2022, 8, 25),
-                datetime(2022, 8, 26),
-                datetime(2022, 8, 27),
-                datetime(2022, 8, 28),
-            ]
-        )
-    ]
+    return df_preseason[is_game_day(df_preseason)]
 
 
 def get_non_weekends(df_preseason):
-    return df_preseason[
-        ~df_preseason.date.isin(
-            [
-                datetime(2022, 8, 4),
-                datetime(2022, 8, 5),
-                datetime(2022, 8, 6),
-                datetime(2022, 8, 7),
-                datetime(2022, 8, 11),
-                datetime(2022, 8, 12),
-                datetime(2022, 8, 13),
-                datetime(2022, 8, 14),
-                datetime(2022, 8, 18),
-                datetime(2022, 8, 19),
-                datetime(2022, 8, 20),
-                datetime(2022, 8, 21),
-                datetime(2022, 8, 22),
-                datetime(2022, 8, 25),
-                datetime(2022, 8, 26),
-                datetime(2022, 8, 27),
-                datetime(2022, 8, 28),
-            ]
+    return df_preseason[~is_game_day(df_preseason)]
+
+
+def cents_text(cents):
+    # Like repr(), no trailing zeros but at least one decimal.
+    whole, frac = divmod(int(cents), 100)
+    return f"{whole}.{frac // 10}" if frac % 10 == 0 else f"{whole}.{frac:02d}"
+
+
+@lru_cache(maxsize=None)
+def get_cents_text():
+    return np.array([cents_text(c) for c in range(100_000)], dtype=object)
+
+
+def get_value_types(values):
+    # Which values are integers (below 1000 they are never divided and
+    # round() keeps them integers) and which are NumPy scalars, which round()
+    # rounds like np.round (rint of the value times 100) instead of by their
+    # exact decimal value. Only values passed one by one can be either, the
+    # values of an array are rounded like Python floats.
+    array = np.asarray(values)
+    if array.dtype.kind == "O" or isinstance(values, (list, tuple, np.generic)):
+        objects = np.asarray(values, dtype=object).ravel()
+        if set(map(type, objects)) <= {float}:
+            return np.zeros(len(objects), dtype=bool), np.zeros(
+                len(objects), dtype=bool
+            )
+        integers = np.array(
+            [isinstance(value, (int, np.integer)) for value in objects], dtype=bool
+        )
+        scalars = np.array(
+            [isinstance(value, np.generic) for value in objects], dtype=bool
         )
-    ]
+        return integers, scalars
+    integers = np.full(array.size, array.dtype.kind in "iub")
+    return integers, np.zeros(array.size, dtype=bool)
 
 
-def human_format(nums):
-    for i, num in enumerate(nums):
-        magnitude = 0
-        if float(num) >= 0:
-            while abs(num) >= 1000:
-                magnitude += 1
-                num /= 1000.0
-            nums[i] = f'{round(num, 2)} {["", "K", "M", "G", "T", "P"][magnitude]}'
-        else:
-            nums[i] = num
+def format_magnitudes(values, prefix="", suffix=""):
+    # The strings f"{round(num, 2)} {unit}" gives after dividing num by 1000
+    # until it is below 1000, for a whole array at once. NaN, negative and
+    # infinite values are not formatted, they come back as None.
+    integers, scalars = get_value_types(values)
+    values = np.asarray(values, dtype="float64")
+    flat = values.ravel()
+    mask = np.isfinite(flat) & (flat >= 0)
+    scaled = np.where(mask, flat, 0.0)
+    magnitude = np.zeros(len(flat), dtype="int64")
+    for _ in UNITS[1:]:
+        large = scaled >= 1000
+        if not large.any():
+            break
+        # Divided step by step like the loop did, so the digits are the same.
+        scaled[large] /= 1000.0
+        magnitude[large] += 1
+
+    cents = np.rint(scaled * 100)
+    # round() rounds the exact decimal value of a float, the product above
+    # can end up on the other side of a tie, so those few go through round().
+    ties = (np.abs(scaled * 100 % 1 - 0.5) < 1e-6) & ~scalars
+    for i in np.flatnonzero(ties):
+        cents[i] = round(round(float(scaled[i]), 2) * 100)
+    cents = cents.astype("int64")
+    table = get_cents_text()
+    known = cents < len(table)
+    text = np.empty(len(flat), dtype=object)
+    text[known] = table[cents[known]]
+    # Only values past "P" or rounded up to 1000 miss the table.
+    text[~known] = [cents_text(c) for c in cents[~known]]
+    text[np.signbit(flat) & mask] = "-0.0"
+    whole = integers & mask & (magnitude == 0)
+    text[whole] = flat[whole].astype("int64").astype(str).astype(object)
+    text = (
+        prefix
+        + text
+        + np.array([f" {unit}{suffix}" for unit in UNITS], dtype=object)[magnitude]
+    )
 
-    return nums
+    formatted = np.full(len(flat), None, dtype=object)
+    formatted[mask] = text[mask]
+    return formatted.reshape(values.shape)
+
+
+def human_format(nums):
+    # Values that are not formatted are passed through as they were.
+    formatted = format_magnitudes(nums)
+    values = np.asarray(nums, dtype=object)
+    return np.where(np.equal(formatted, None), values, formatted).tolist()
 
 
 def human_format_single(num):
-    magnitude = 0
-    if float(num) >= 0:
-        while abs(num) >= 1000:
-            magnitude += 1
-            num /= 1000.0
-        num = f'{round(num, 2)} {["", "K", "M", "G", "T", "P"][magnitude]}'
-    else:
-        pass
-    return num
+    formatted = format_magnitudes(num)[()]
+    return num if formatted is None else formatted
+
+
+def format_currency(values):
+    return format_magnitudes(values, prefix="$ ")
@@ -0,0 +1,112 @@
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+CALENDAR_FILE = os.getenv(
+    "CALENDAR_FILE",
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "data", "nfl_calendar.json"
+    ),
+)
+OFFSEASON = "Offseason"
+PHASES = [OFFSEASON, "Preseason", "Regular season", "Playoffs"]
+
+
+class Calendar:
+    def __init__(self, seasons):
+        self.phases = []
+        self.game_windows = []
+        for year, season in sorted(seasons.items()):
+            for window in season.get("phases", []):
+                self.phases.append(dict(window, year=int(year)))
+            for window in season.get("game_windows", []):
+                self.game_windows.append(dict(window, year=int(year)))
+            weeks = season.get("regular_season_weeks")
+            if weeks:
+                first = pd.Timestamp(weeks["first"])
+                for week in range(weeks["count"]):
+                    start = first + pd.Timedelta(weeks=week)
+                    end = start + pd.Timedelta(days=weeks["days"] - 1)
+                    self.game_windows.append(
+                        dict(
+                            name=f"Week {week + 1}",
+                            kind="regular_season_week",
+                            start=start.strftime("%Y-%m-%d"),
+                            end=end.strftime("%Y-%m-%d"),
+                            year=int(year),
+                        )
+                    )
+        self.phases.sort(key=lambda window: window["start"])
+        self.game_windows.sort(key=lambda window: window["start"])
+        self._phase_bounds = get_bounds(self.phases)
+        self._phase_codes = np.array(
+            [PHASES.index(window["name"]) for window in self.phases], dtype="int8"
+        )
+        self._game_bounds = get_bounds(self.game_windows)
+
+    def get_phases(self, name=None, start=None, end=None):
+        return select_windows(self.phases, "name", name, start, end)
+
+    def get_game_windows(self, kinds=None, start=None, end=None):
+        return select_windows(self.game_windows, "kind", kinds, start, end)
+
+    def label_phase(self, dates):
+        index = lookup(self._phase_bounds, dates)
+        codes = np.where(index >= 0, self._phase_codes[index], 0)
+        return pd.Categorical.from_codes(codes, categories=PHASES)
+
+    def is_game_day(self, dates):
+        return lookup(self._game_bounds, dates) >= 0
+
+
+def select_windows(windows, field, values, start=None, end=None):
+    # Windows of the given names/kinds that overlap start..end (inclusive).
+    if isinstance(values, str):
+        values = [values]
+    start = None if start is None else pd.Timestamp(start).strftime("%Y-%m-%d")
+    end = None if end is None else pd.Timestamp(end).strftime("%Y-%m-%d")
+    return [
+        window
+        for window in windows
+        if (values is None or window[field] in values)
+        and (start is None or window["end"] >= start)
+        and (end is None or window["start"] <= end)
+    ]
+
+
+def get_bounds(windows):
+    # Windows are inclusive whole days and must not overlap, so a date falls
+    # in the last window starting on or before it, if that one has not ended.
+    starts = pd.to_datetime([window["start"] for window in windows])
+    ends = pd.to_datetime([window["end"] for window in windows]) + pd.Timedelta(days=1)
+    if len(windows) > 1 and (starts[1:] < ends[:-1]).any():
+        raise ValueError("Calendar windows overlap")
+    return starts.values, ends.values
+
+
+def lookup(bounds, dates):
+    starts, ends = bounds
+    dates = np.asarray(dates, dtype="datetime64[ns]")
+    index = np.searchsorted(starts, dates, side="right") - 1
+    if not len(starts):
+        return index
+    found = (index >= 0) & (dates < ends[index.clip(0)])
+    return np.where(found, index, -1)
+
+
+@lru_cache(maxsize=None)
+def load_calendar(path=CALENDAR_FILE):
+    with open(path) as f:
+        return Calendar(json.load(f))
+
+
+def add_calendar_labels(df):
+    # Labelled once at ingest, weekend/weekday and per phase numbers are then
+    # just a groupby on these columns.
+    calendar = load_calendar()
+    df["phase"] = calendar.label_phase(df["date"])
+    df["game_day"] = calendar.is_game_day(df["date"])
+    return df
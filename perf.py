@@ -0,0 +1,117 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import numpy as np
+
+PERF_LOG = os.getenv("PERF_LOG", "0") == "1"
+PERF_PANEL = os.getenv("PERF_PANEL", "0") == "1"
+# Number of recent timings per stage the percentiles are computed over.
+PERF_WINDOW = int(os.getenv("PERF_WINDOW", 200))
+
+logger = logging.getLogger("perf")
+if PERF_LOG:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_history = defaultdict(lambda: deque(maxlen=PERF_WINDOW))
+_counters = defaultdict(int)
+_lock = threading.Lock()
+# Every session reruns the script on its own thread.
+_local = threading.local()
+
+
+class Run:
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex[:8]
+        self.name = name
+        self.started = time.perf_counter()
+        self.stages = []
+        self.counters = defaultdict(int)
+
+    @property
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+
+def start_run(name="rerun"):
+    _local.run = Run(name)
+    return _local.run
+
+
+def get_run():
+    return getattr(_local, "run", None)
+
+
+def finish_run():
+    run = get_run()
+    if run is not None:
+        record("run", run.elapsed_ms, name=run.name, stages=len(run.stages))
+        _local.run = None
+    return run
+
+
+def record(stage, ms, **fields):
+    run = get_run()
+    entry = dict(stage=stage, ms=round(ms, 3), **fields)
+    if run is not None and stage != "run":
+        run.stages.append(entry)
+    with _lock:
+        _history[stage].append(ms)
+    if PERF_LOG:
+        logger.info(
+            json.dumps(
+                dict(ts=time.time(), run=run and run.id, **entry),
+                default=str,
+            )
+        )
+
+
+@contextmanager
+def timed(stage, **fields):
+    # Callers can add fields (e.g. rows) to the yielded dict before it is
+    # recorded.
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        record(stage, (time.perf_counter() - start) * 1000, **fields)
+
+
+def count(name, n=1):
+    run = get_run()
+    if run is not None:
+        run.counters[name] += n
+    with _lock:
+        _counters[name] += n
+
+
+def get_stats():
+    with _lock:
+        history = {stage: list(timings) for stage, timings in _history.items()}
+    return [
+        dict(
+            stage=stage,
+            count=len(timings),
+            p50_ms=float(np.percentile(timings, 50)),
+            p95_ms=float(np.percentile(timings, 95)),
+        )
+        for stage, timings in sorted(history.items())
+    ]
+
+
+def get_counters():
+    with _lock:
+        return dict(_counters)
+
+
+def is_panel_enabled(query_params):
+    return PERF_PANEL or query_params.get("perf", ["0"])[0] == "1"
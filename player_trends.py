@@ -1,66 +1,60 @@
-import numpy as np
-import pandas as pd
-
 import plotly.express as px
 
+from myutils import format_currency
+from rollups import as_rollup, grain, keep_top, lump_other
 
-def get_fig_player_seasons(df_daily_sales_ps_player_season, val_player):
-    df_daily_sales_ps_player_season.loc[
-        df_daily_sales_ps_player_season.player == "N/A", "player"
-    ] = "Team Play"
 
-    df_daily_sales_ps_player_season = (
-        df_daily_sales_ps_player_season.groupby(["player", "season"])
-        .agg({"total": lambda x: (np.sum(x))})
-        .reset_index()
+@grain("player", "season")
+def get_fig_player_seasons(df_daily_sales_ps_player_season, val_player):
+    rollup = as_rollup(df_daily_sales_ps_player_season)
+    top_players = rollup.top("player", 50)
+    # Integer seasons would get a continuous color scale, seasons beyond the
+    # trace budget are summed into "Other".
+    df_daily_sales_ps_player_season = lump_other(
+        keep_top(rollup.get("player", "season"), top_players, "player").astype(
+            {"season": str}
+        ),
+        "season",
+        ["player", "season"],
+        ["total"],
     )
-    df_daily_sales_ps_player_season = pd.merge(
-        df_daily_sales_ps_player_season,
-        df_daily_sales_ps_player_season.groupby(["player"])
-        .sum()
-        .reset_index()
-        .nlargest(50, columns="total"),
-        on="player",
-    ).sort_values(by="total_y", ascending=False)
 
     return px.bar(
         df_daily_sales_ps_player_season,
         x="player",
-        y="total_x",
+        y="total",
         color="season",
-        category_orders={"player": df_daily_sales_ps_player_season["player"].to_list()},
+        category_orders={"player": top_players["player"].to_list()},
         title=f"Top 50 most valuable players sold {val_player}",
-        labels=dict(total_x="Value (USD)", player="Player Name"),
+        labels=dict(total="Value (USD)", player="Player Name"),
     )
 
 
+@grain("player", "player_position")
 def get_fig_player_seasons_price(df_daily_sales_ps_player_season, val_player):
-    df_daily_sales_ps_player_season.loc[
-        df_daily_sales_ps_player_season.player == "N/A", "player"
-    ] = "Team Play"
-
-    df_daily_sales_ps_player_season = (
-        df_daily_sales_ps_player_season.groupby(["player", "player_position"])
-        .agg({"avg_price": lambda x: (np.mean(x))})
-        .reset_index()
+    # Players are ranked by the mean price of all their sales, not the sum of
+    # the per position averages.
+    rollup = as_rollup(df_daily_sales_ps_player_season)
+    top_players = rollup.top("player", 50, by="avg_price")
+    df_daily_sales_ps_player_season = keep_top(
+        rollup.get(
+            "player", "player_position", estimates=["median_price", "p95_price"]
+        ),
+        top_players,
+        "player",
     )
-    df_daily_sales_ps_player_season = pd.merge(
-        df_daily_sales_ps_player_season,
-        df_daily_sales_ps_player_season.groupby(["player"])
-        .sum()
-        .reset_index()
-        .nlargest(50, columns="avg_price"),
-        on="player",
-    ).sort_values(by="avg_price_y", ascending=False)
     fig_avg_position = px.bar(
         df_daily_sales_ps_player_season,
         x="player",
-        y="avg_price_x",
+        y="avg_price",
         color="player_position",
-        category_orders={"player": df_daily_sales_ps_player_season["player"].to_list()},
+        hover_data=dict(median_price=":,.2f", p95_price=":,.2f"),
+        category_orders={"player": top_players["player"].to_list()},
         title=f"Top 50 players who produced the most expensive moments that sold {val_player}",
         labels=dict(
-            avg_price_x="Average Price (USD)",
+            avg_price="Average Price (USD)",
+            median_price="Median Price (USD)",
+            p95_price="95th Percentile (USD)",
             player="Player Name",
             player_position="Position",
         ),
@@ -71,16 +65,18 @@ def get_fig_player_seasons_price(df_daily_sales_ps_player_season, val_player):
     return fig_avg_position
 
 
+@grain("play_type", "moment_tier")
 def get_fig_moment_playtype(df, val_player):
-    df_daily_sales_moment_playtype = (
-        df.groupby(["play_type", "moment_tier"]).sum().reset_index()
+    df_daily_sales_moment_playtype = as_rollup(df).get("play_type", "moment_tier")
+    df_daily_sales_moment_playtype = df_daily_sales_moment_playtype.assign(
+        total_text=format_currency(df_daily_sales_moment_playtype.total)
     )
     fig_moment_playtype = px.bar(
         df_daily_sales_moment_playtype,
         x="play_type",
         y="total",
         color="moment_tier",
-        text="total",
+        text="total_text",
         title=f"What moments were most sought out {val_player}",
         labels=dict(play_type="Play Type", total="Amount (USD)", moment_tier="Tier"),
     )
@@ -98,9 +94,10 @@ def get_fig_moment_playtype(df, val_player):
     return fig_moment_playtype
 
 
+@grain("player_position", "play_type")
 def get_fig_moment_player_position(df, val_player):
-    df_daily_sales_moment_play_position = (
-        df.groupby(["player_position", "play_type"]).mean().reset_index()
+    df_daily_sales_moment_play_position = as_rollup(df).get(
+        "player_position", "play_type", estimates=["median_price", "p95_price"]
     )
     fig_moment_play_position = px.bar(
         df_daily_sales_moment_play_position,
@@ -109,6 +106,7 @@ def get_fig_moment_player_position(df, val_player):
         color="play_type",
         text="avg_price",
         text_auto=".2s",
+        hover_data=["median_price", "p95_price"],
         title=f"What player positions and play type were priceless {val_player}",
         labels=dict(
             play_type="Play Type",
@@ -121,6 +119,8 @@ def get_fig_moment_player_position(df, val_player):
             [
                 "Player Position: %{x}",
                 "Average Price: $%{y:,.2f}",
+                "Median Price: $%{customdata[0]:,.2f}",
+                "95th Percentile: $%{customdata[1]:,.2f}",
             ]
         )
     )
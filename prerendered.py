@@ -0,0 +1,92 @@
+import json
+import os
+import threading
+
+import pandas as pd
+import plotly.io as pio
+
+from perf import count, timed
+from windows import ALL_DATES
+
+# Output of render_all.py the app serves figures from, unset builds them live.
+PRERENDERED_DIR = os.getenv("PRERENDERED_DIR")
+MANIFEST_FILE = "manifest.json"
+
+
+def list_renders(root):
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        name
+        for name in os.listdir(root)
+        if not name.startswith(".")
+        and os.path.isfile(os.path.join(root, name, MANIFEST_FILE))
+    )
+
+
+def read_manifest(root, version):
+    with open(os.path.join(root, version, MANIFEST_FILE)) as f:
+        return json.load(f)
+
+
+def get_timeframe(args):
+    # Builders get (data, label), the ones of the daily tab just the data.
+    return args[1] if len(args) > 1 else ALL_DATES
+
+
+class PrerenderedFigures:
+    def __init__(self, root=PRERENDERED_DIR):
+        self.root = root
+        self.version = None
+        self.refreshed_at = None
+        self._paths = {}
+        self._figures = {}
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        # Picks up a newer render as soon as it is moved into place.
+        renders = list_renders(self.root)
+        version = renders[-1] if renders else None
+        with self._lock:
+            if version == self.version:
+                return
+            manifest = read_manifest(self.root, version) if version else {}
+            self._paths = {
+                (figure["builder"], figure["timeframe"]): figure["json"]
+                for figure in manifest.get("figures", [])
+            }
+            self._figures = {}
+            self.version = version
+            self.refreshed_at = (
+                pd.Timestamp(manifest["refreshed_at"]) if version else None
+            )
+
+    def get(self, builder, args, data_version=None):
+        # data_version is the version of the data the app serves (its
+        # refresh time), a render of older data would disagree with the live
+        # metrics next to it.
+        self.refresh()
+        key = (builder.__name__, get_timeframe(args))
+        with self._lock:
+            version, path = self.version, self._paths.get(key)
+            refreshed_at = self.refreshed_at
+            fig = self._figures.get(key)
+        if path is None:
+            count("prerendered.miss")
+            return None
+        if data_version is not None and refreshed_at < pd.Timestamp(data_version):
+            count("prerendered.stale")
+            return None
+        count("prerendered.hit")
+        if fig is None:
+            try:
+                with timed("load_prerendered", figure=builder.__name__):
+                    with open(os.path.join(self.root, version, path)) as f:
+                        fig = pio.from_json(f.read())
+            except FileNotFoundError:
+                # Pruned since the manifest was read, built live this time.
+                return None
+            with self._lock:
+                if self.version == version:
+                    self._figures[key] = fig
+        return fig
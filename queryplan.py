@@ -0,0 +1,195 @@
+import os
+import threading
+import time
+from functools import partial
+
+import pandas as pd
+
+from ingest import SEASON_START, get_daily_sales_sql, get_utc_start
+from perf import count
+from refresher import REFRESH_AHEAD, Refresher
+from rollups import Rollup, get_rollup
+from windows import select_window
+
+QUERY_TTL = int(os.getenv("QUERY_TTL", 30 * 60))
+
+# Derived from the date at decode time (see nflcalendar.py), so a query for
+# these is a query by date.
+CALENDAR_DIMS = {"phase": "date", "game_day": "date"}
+
+# The grains carry the price count next to the total so avg_price stays the
+# exact mean, and merge the wallet sketches and price digests the same way
+# rollups.py does.
+GRAIN_SQL = """
+    with daily_sales as ({daily_sales})
+    select
+        {dims},
+        sum(total) as total,
+        sum(sales) as sales,
+        sum(sellers) as sellers,
+        sum(buyers) as buyers,
+        sum(price_count) as price_count,
+        approx_percentile_combine(price_digest) as price_digest,
+        hll_export(hll_combine(hll_import(buyers_hll))) as buyers_hll,
+        hll_export(hll_combine(hll_import(sellers_hll))) as sellers_hll
+    from daily_sales
+    {where}
+    group by {dims}
+    """
+GRAIN_MEASURES = [
+    "total",
+    "sales",
+    "sellers",
+    "buyers",
+    "price_count",
+    "price_digest",
+    "buyers_hll",
+    "sellers_hll",
+]
+
+
+def get_query_dims(dims):
+    query_dims = []
+    for dim in dims:
+        dim = CALENDAR_DIMS.get(dim, dim)
+        if dim not in query_dims:
+            query_dims.append(dim)
+    return tuple(query_dims)
+
+
+def plan_queries(grains):
+    # Only the grains no other grain covers are queried, the rest are rolled
+    # up locally from one of those.
+    grains = {get_query_dims(dims) for dims in grains}
+    return sorted(
+        dims for dims in grains if not any(set(dims) < set(other) for other in grains)
+    )
+
+
+def get_grain_sql(dims, window=None):
+    start, end = window or (None, None)
+    # The start also prunes the scan of the sales table.
+    daily_sales = get_daily_sales_sql(get_utc_start(start) if start else SEASON_START)
+    where = []
+    if start:
+        where.append(f"date >= '{start}'")
+    if end:
+        where.append(f"date <= '{end}'")
+    return GRAIN_SQL.format(
+        daily_sales=daily_sales,
+        dims=", ".join(dims),
+        where=f"where {' and '.join(where)}" if where else "",
+    )
+
+
+class PlannedRollup(Rollup):
+    def __init__(self, frames, version):
+        super().__init__(None)
+        self.frames = frames
+        self._version = version
+
+    @property
+    def version(self):
+        return self._version
+
+    def _get_source(self, dims, columns=()):
+        # The smallest fetched grain that has every column, the calendar labels
+        # come along with the date. The queries group missing keys too, so
+        # every fetched grain still holds all the rows.
+        covering = [df for df in self.frames if set(dims) <= set(df.columns)]
+        if not covering:
+            raise LookupError(f"No fetched grain has {dims}, declare it with @grain")
+        return min(covering, key=len)
+
+
+class QueryLayer:
+    def __init__(self, run_query, ttl=QUERY_TTL, refresher=None, ahead=REFRESH_AHEAD):
+        # run_query(sql, names) returns the typed frame of a query.
+        self.run_query = run_query
+        self.ttl = ttl
+        self.ahead = ahead
+        self.refresher = refresher or Refresher()
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def rollup(self, grains, window=None):
+        frames = [self.fetch(dims, window) for dims in plan_queries(grains)]
+        version = max((df.attrs["version"] for df in frames), default=None)
+        return PlannedRollup(frames, version)
+
+    def fetch(self, dims, window=None):
+        # Any result of the same window with every dimension will do. A stale
+        # one is served while it is fetched again, only a grain that was never
+        # fetched waits for its query.
+        key = self.find(dims, window)
+        if key is None:
+            count("query_layer.miss")
+            key = (dims, window)
+            self.refresher.run(("query", key), partial(self._fetch, key))
+        else:
+            count("query_layer.hit")
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                result["used_at"] = time.monotonic()
+        if result is None:
+            # Dropped as idle since it was found.
+            return self.fetch(dims, window)
+        if self.is_stale(result):
+            count("query_layer.stale")
+            self.refresher.run_in_background(("query", key), partial(self._fetch, key))
+        return result["df"]
+
+    def _fetch(self, key):
+        dims, window = key
+        fetched_at = pd.Timestamp.now(tz="UTC")
+        df = self.run_query(get_grain_sql(dims, window), list(dims) + GRAIN_MEASURES)
+        df.attrs["version"] = fetched_at.isoformat()
+        with self._lock:
+            used_at = self._results.get(key, {}).get("used_at", time.monotonic())
+            self._results[key] = dict(df=df, fetched_at=fetched_at, used_at=used_at)
+        if not self.refresher.is_scheduled(("query", key)):
+            interval = self.ttl * self.ahead
+            self.refresher.schedule(
+                ("query", key), partial(self._revalidate, key), interval
+            )
+        return df
+
+    def _revalidate(self, key):
+        # Grains nobody read for a whole TTL stop being refreshed and are
+        # dropped (custom ranges would pile up otherwise), they are fetched
+        # again on their next read.
+        with self._lock:
+            idle = time.monotonic() - self._results[key]["used_at"]
+            if idle > self.ttl:
+                del self._results[key]
+        if idle > self.ttl:
+            self.refresher.cancel(("query", key))
+            return None
+        return self._fetch(key)
+
+    def is_stale(self, result):
+        age = pd.Timestamp.now(tz="UTC") - result["fetched_at"]
+        return age.total_seconds() >= self.ttl
+
+    def find(self, dims, window):
+        # Prefers fresh results, then the smallest one.
+        with self._lock:
+            candidates = [
+                (self.is_stale(result), len(result["df"]), key)
+                for key, result in self._results.items()
+                if key[1] == window and set(dims) <= set(key[0])
+            ]
+        return min(candidates, default=(None, None, None))[2]
+
+
+class FrameLayer:
+    # The same interface over the full eight dimension rows, every grain is
+    # rolled up locally.
+    def __init__(self, load_data):
+        self.load_data = load_data
+
+    def rollup(self, grains, window=None):
+        return get_rollup(
+            self.load_data(), window, lambda df: select_window(df, window)
+        )
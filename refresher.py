@@ -0,0 +1,131 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from perf import count, timed
+
+# Datasets are refreshed in the background once this fraction of their TTL has
+# passed, so readers find fresh data before it expires.
+REFRESH_AHEAD = float(os.getenv("REFRESH_AHEAD", 0.8))
+# Seconds before a failed refresh is retried, the old data is served meanwhile.
+REFRESH_RETRY = int(os.getenv("REFRESH_RETRY", 60))
+REFRESH_WORKERS = int(os.getenv("REFRESH_WORKERS", 2))
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    # Concurrent calls with the same key share one execution (and its result
+    # or exception) instead of each running it.
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            count("single_flight.shared")
+            return future.result()
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result()
+
+    def is_running(self, key):
+        with self._lock:
+            return key in self._calls
+
+
+class Refresher:
+    def __init__(self, workers=REFRESH_WORKERS, retry=REFRESH_RETRY):
+        self.retry = retry
+        self.flight = SingleFlight()
+        self._jobs = {}
+        self._condition = threading.Condition()
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="refresher")
+        self._thread = None
+
+    def run(self, key, fn):
+        # Every refresh of a key goes through here, scheduled or not.
+        return self.flight.do(key, fn)
+
+    def run_in_background(self, key, fn):
+        if self.flight.is_running(key):
+            return None
+        return self._pool.submit(self._run, key, fn)
+
+    def schedule(self, key, fn, interval, delay=None):
+        # Runs fn every interval seconds from now (or from delay seconds), a
+        # job with the same key is replaced.
+        delay = interval if delay is None else max(delay, 0)
+        with self._condition:
+            self._jobs[key] = dict(
+                fn=fn, interval=interval, due=time.monotonic() + delay, running=False
+            )
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def cancel(self, key):
+        with self._condition:
+            self._jobs.pop(key, None)
+
+    def is_scheduled(self, key):
+        with self._condition:
+            return key in self._jobs
+
+    def _run(self, key, fn):
+        # Background refreshes have no caller to raise to, so a failure is
+        # logged here and the previous data stays served. Returns whether the
+        # refresh succeeded.
+        with timed("refresh", key=str(key)) as fields:
+            count("refresher.run")
+            try:
+                self.run(key, fn)
+                return True
+            except Exception:
+                count("refresher.failed")
+                fields["failed"] = True
+                logger.exception("Refreshing %s failed", key)
+                return False
+
+    def _loop(self):
+        while True:
+            with self._condition:
+                now = time.monotonic()
+                waiting = [job for job in self._jobs.values() if not job["running"]]
+                due = [
+                    (key, job)
+                    for key, job in self._jobs.items()
+                    if not job["running"] and job["due"] <= now
+                ]
+                if not due:
+                    timeout = min((job["due"] for job in waiting), default=None)
+                    self._condition.wait(None if timeout is None else timeout - now)
+                    continue
+                for key, job in due:
+                    job["running"] = True
+                    self._pool.submit(self._run_job, key, job)
+
+    def _run_job(self, key, job):
+        delay = job["interval"]
+        try:
+            if not self._run(key, job["fn"]):
+                logger.info("Retrying %s in %ss", key, self.retry)
+                delay = self.retry
+        finally:
+            with self._condition:
+                job["running"] = False
+                job["due"] = time.monotonic() + delay
+                self._condition.notify()
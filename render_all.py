@@ -0,0 +1,256 @@
+import argparse
+import html
+import json
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+
+from daily_trends import get_daily_team_fig, get_daily_trends
+from figpayload import compact_figure, figure_to_html, serialize_figure
+from player_trends import (
+    get_fig_moment_player_position,
+    get_fig_moment_playtype,
+    get_fig_player_seasons,
+    get_fig_player_seasons_price,
+)
+from prerendered import MANIFEST_FILE, list_renders
+from rollups import Rollup
+from seasonal_trends import get_fig_moment_season, get_fig_week_season
+from sharedstore import SHARED_DIR, get_latest_version, read_version, write_version
+from snapshot import SNAPSHOT_DIR, read_latest_snapshot
+from team_trends import get_fig_moment, get_fig_team_season, get_fig_team_season_total
+from windows import ALL_DATES, get_named_windows, select_window
+
+PRERENDERED_DIR = os.getenv("PRERENDERED_DIR", ".prerendered")
+PRERENDERED_KEEP = int(os.getenv("PRERENDERED_KEEP", 3))
+PLOTLYJS_FILE = "plotly.min.js"
+
+BUILDERS = [
+    get_daily_trends,
+    get_daily_team_fig,
+    get_fig_moment,
+    get_fig_team_season_total,
+    get_fig_team_season,
+    get_fig_player_seasons,
+    get_fig_player_seasons_price,
+    get_fig_moment_playtype,
+    get_fig_moment_player_position,
+    get_fig_moment_season,
+    get_fig_week_season,
+]
+
+pio.templates.default = "plotly_dark"
+logger = logging.getLogger(__name__)
+
+# The rows of the worker process, mapped from the staged Arrow file.
+_df = None
+
+
+def get_args(builder, rollup, label):
+    # The same arguments the app passes, see prerendered.get_timeframe.
+    if builder is get_daily_trends:
+        return (rollup.get("date"),)
+    if builder is get_daily_team_fig:
+        return (rollup,)
+    return (rollup, label)
+
+
+def get_slug(label):
+    return re.sub(r"[^a-z0-9]+", "-", label.lower()).strip("-")
+
+
+def load_dataset(source, root):
+    if source == "shared":
+        version = get_latest_version(root)
+        return read_version(version, root) if version else None
+    return read_latest_snapshot(root)
+
+
+def init_worker(root, version):
+    global _df
+    pio.templates.default = "plotly_dark"
+    warnings.filterwarnings("ignore", category=FutureWarning)
+    _df = read_version(version, root)["df"]
+
+
+def render_timeframe(output_dir, label, window, names):
+    # One task per timeframe, so its builders share the rollups.
+    rollup = Rollup(select_window(_df, window), window, _df)
+    slug = get_slug(label)
+    os.makedirs(os.path.join(output_dir, slug), exist_ok=True)
+    figures, errors = [], []
+    for builder in BUILDERS:
+        name = builder.__name__
+        if name not in names:
+            continue
+        start = time.perf_counter()
+        try:
+            fig = compact_figure(builder(*get_args(builder, rollup, label)))
+        except Exception as e:
+            logger.exception("Rendering %s for %s failed", name, label)
+            errors.append(dict(builder=name, timeframe=label, error=repr(e)))
+            continue
+        payload = serialize_figure(fig)
+        paths = dict(json=f"{slug}/{name}.json", html=f"{slug}/{name}.html")
+        with open(os.path.join(output_dir, paths["json"]), "w") as f:
+            f.write(payload)
+        with open(os.path.join(output_dir, paths["html"]), "w") as f:
+            f.write(figure_to_html(fig, plotlyjs=f"../{PLOTLYJS_FILE}"))
+        figures.append(
+            dict(
+                builder=name,
+                timeframe=label,
+                window=window,
+                bytes=len(payload.encode()),
+                ms=round((time.perf_counter() - start) * 1000, 2),
+                **paths,
+            )
+        )
+    return figures, errors
+
+
+def write_index(output_dir, manifest):
+    # A page linking every standalone chart, for publishing the directory.
+    lines = [f"<h1>NFL All Day, data as of {html.escape(manifest['watermark'])}</h1>"]
+    for label in manifest["timeframes"]:
+        lines.append(f"<h2>{html.escape(label)}</h2><ul>")
+        for figure in manifest["figures"]:
+            if figure["timeframe"] == label:
+                lines.append(
+                    f'<li><a href="{html.escape(figure["html"])}">'
+                    f'{html.escape(figure["builder"])}</a></li>'
+                )
+        lines.append("</ul>")
+    with open(os.path.join(output_dir, "index.html"), "w") as f:
+        f.write(
+            "<!DOCTYPE html>\n<html><body>\n" + "\n".join(lines) + "\n</body></html>\n"
+        )
+
+
+def prune_renders(root, keep=PRERENDERED_KEEP):
+    for version in list_renders(root)[:-keep]:
+        shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+
+
+def render_all(
+    dataset, output, workers=None, names=None, keep=PRERENDERED_KEEP, root=None
+):
+    # root/version is the dataset as a shared Arrow file, written to a
+    # temporary directory when it comes from a snapshot. Every worker maps it
+    # instead of reading its own copy.
+    names = set(names or [builder.__name__ for builder in BUILDERS])
+    version = dataset.get("version") or dataset["refreshed_at"].strftime(
+        "%Y%m%dT%H%M%S%f"
+    )
+    timeframes = {ALL_DATES: None, **get_named_windows(today=dataset["watermark"])}
+
+    staging = None
+    if root is None:
+        staging = root = tempfile.mkdtemp(prefix="render-")
+        version = write_version(
+            dataset["df"], dataset["watermark"], dataset["refreshed_at"], root
+        )
+    # Written to a hidden directory first so the app never sees half a render.
+    os.makedirs(output, exist_ok=True)
+    tmp_dir = os.path.join(output, f".tmp-{version}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    figures, errors = [], []
+    try:
+        # spawn, forking after pyarrow started its threads is not safe.
+        with ProcessPoolExecutor(
+            workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(root, version),
+        ) as pool:
+            tasks = [
+                pool.submit(render_timeframe, tmp_dir, label, window, names)
+                for label, window in timeframes.items()
+            ]
+            for task in tasks:
+                rendered, failed = task.result()
+                figures += rendered
+                errors += failed
+    finally:
+        if staging:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    with open(os.path.join(tmp_dir, PLOTLYJS_FILE), "w") as f:
+        f.write(get_plotlyjs())
+    manifest = dict(
+        version=version,
+        watermark=dataset["watermark"].strftime("%Y-%m-%d"),
+        refreshed_at=dataset["refreshed_at"].isoformat(),
+        rendered_at=pd.Timestamp.now(tz="UTC").isoformat(),
+        timeframes=list(timeframes),
+        figures=figures,
+        errors=errors,
+    )
+    write_index(tmp_dir, manifest)
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+    path = os.path.join(output, version)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_dir, path)
+    prune_renders(output, keep)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Render every figure for every timeframe from a data snapshot"
+    )
+    parser.add_argument("--source", choices=["snapshot", "shared"], default="snapshot")
+    parser.add_argument(
+        "--data-dir", help=f"defaults to {SNAPSHOT_DIR} or {SHARED_DIR} by source"
+    )
+    parser.add_argument("--output", default=PRERENDERED_DIR)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--only", nargs="+", choices=[builder.__name__ for builder in BUILDERS]
+    )
+    parser.add_argument("--keep", type=int, default=PRERENDERED_KEEP)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    data_dir = args.data_dir or (
+        SHARED_DIR if args.source == "shared" else SNAPSHOT_DIR
+    )
+    dataset = load_dataset(args.source, data_dir)
+    if dataset is None:
+        print(f"no {args.source} data in {data_dir}", file=sys.stderr)
+        return 2
+    start = time.perf_counter()
+    manifest = render_all(
+        dataset,
+        args.output,
+        args.workers,
+        args.only,
+        args.keep,
+        # A shared version is mapped by the workers as it is.
+        root=data_dir if args.source == "shared" else None,
+    )
+    print(
+        f"{len(manifest['figures'])} figures for {len(manifest['timeframes'])} "
+        f"timeframes in {time.perf_counter() - start:.1f} s, written to "
+        f"{os.path.join(args.output, manifest['version'])}"
+    )
+    for error in manifest["errors"]:
+        print(f"FAILED {error['builder']} for {error['timeframe']}: {error['error']}")
+    return 1 if manifest["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from hll import SKETCHES, merge_sketches
+from leaderboard import LEADERBOARD_DIMS, get_leaderboards
+from perf import count, timed
+from schema import freeze
+from tdigest import DIGESTS, merge_digests
+
+# Additive measures, so any grain can be rolled up further from a finer one.
+# avg_price is total / price_count, the exact mean price of the group's sales.
+MEASURES = ["total", "sales", "sellers", "buyers", "price_count"]
+# Estimate column -> the sketch or digest column it is merged from.
+ESTIMATES = {
+    **{estimate: col for col, estimate in SKETCHES.items()},
+    **{quantile: col for col, quantiles in DIGESTS.items() for quantile in quantiles},
+}
+
+ROLLUP_CACHE_SIZE = 8
+# Charts with one trace per group show at most this many traces.
+TRACE_BUDGET = int(os.getenv("TRACE_BUDGET", 16))
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class Rollup:
+    def __init__(self, df, window=None, rows=None):
+        self.df = df
+        # The full rows df was cut out of with window, top() reads their
+        # leaderboards.
+        self.window = window
+        self.rows = rows
+        self._grains = {}
+        self._nulls = {}
+
+    @property
+    def version(self):
+        return self.df.attrs.get("version")
+
+    def get(self, *dims, estimates=()):
+        # estimates are the sketch columns the caller reads (e.g.
+        # unique_buyers). Merging sketches costs far more than the sums, so a
+        # grain only merges the ones asked for, once.
+        dims = tuple(dims)
+        if dims not in self._grains:
+            with timed("rollup", dims=",".join(dims)) as fields:
+                self._grains[dims] = freeze(aggregate(self._get_source(dims), dims))
+                fields["rows"] = len(self._grains[dims])
+        grain = self._grains[dims]
+        sketches = list(
+            dict.fromkeys(ESTIMATES[col] for col in estimates if col not in grain)
+        )
+        if sketches:
+            with timed("rollup", dims=",".join(dims), sketches=",".join(sketches)):
+                source = self._get_source(dims, sketches)
+                grain = add_sketches(grain.copy(), source, dims, sketches)
+                self._grains[dims] = grain = freeze(grain)
+        return grain
+
+    def top(self, dim, n, by="total"):
+        # The n largest groups of one dimension, from its leaderboard when
+        # there is one instead of a pass over the rows.
+        if self.rows is not None and dim in LEADERBOARD_DIMS:
+            with timed("rollup", dims=dim, top=n):
+                return get_leaderboards(self.rows)[dim].top(n, by, self.window)
+        grain = self.get(dim)
+        grain = grain[grain.sales > 0].sort_values([by, dim], ascending=[False, True])
+        return grain[:n]
+
+    def _get_source(self, dims, columns=()):
+        # The smallest grain already built that still has every dimension and
+        # column, only fall back to the raw rows when there is none. A grain
+        # lost the rows with a missing key, so it only stands in for the rows
+        # when its other dimensions have no missing values.
+        finer = [
+            grain
+            for key, grain in list(self._grains.items())
+            if set(dims) < set(key)
+            and set(columns) <= set(grain.columns)
+            and not any(self._has_nulls(dim) for dim in set(key) - set(dims))
+        ]
+        return min(finer, key=len) if finer else self.df
+
+    def _has_nulls(self, dim):
+        if dim not in self._nulls:
+            self._nulls[dim] = bool(self.df[dim].isna().any())
+        return self._nulls[dim]
+
+
+def aggregate(source, dims):
+    grain = (
+        source.groupby(list(dims), observed=True)
+        .agg(**{col: (col, "sum") for col in MEASURES})
+        .sort_index()
+        .reset_index()
+    )
+    grain["avg_price"] = grain.total / grain.price_count
+    return grain
+
+
+def add_sketches(grain, source, dims, sketches):
+    # Distinct wallets and quantiles do not add up across groups, the
+    # sketches are merged into the groups of the grain and estimated again.
+    # The grain row of every source row, ngroup numbers categorical groups by
+    # first appearance rather than in the order of the grain. Rows with a
+    # missing key belong to no group, like in the aggregation. An empty grain
+    # is skipped, pandas gives its categories codes too narrow for the index.
+    sketches = [col for col in sketches if col in source]
+    if not sketches:
+        return grain
+    if grain.empty:
+        groups = np.full(len(source), -1)
+    else:
+        groups = pd.MultiIndex.from_frame(grain[list(dims)]).get_indexer(
+            pd.MultiIndex.from_frame(source[list(dims)])
+        )
+    for col in sketches:
+        if col in SKETCHES:
+            merged, estimates = merge_sketches(source[col], groups, len(grain))
+            grain[col] = merged
+            grain[SKETCHES[col]] = estimates
+        else:
+            quantiles = DIGESTS[col]
+            merged, values = merge_digests(
+                source[col], groups, len(grain), list(quantiles.values())
+            )
+            grain[col] = merged
+            for quantile_col, q in quantiles.items():
+                grain[quantile_col] = values[q]
+    return grain
+
+
+def grain(*dims):
+    # Declares the grain a figure builder reads, so the query layer can fetch
+    # just that rollup instead of the full rows.
+    def decorate(builder):
+        builder.grain = dims
+        return builder
+
+    return decorate
+
+
+def add_group_total(df, by, measure="total"):
+    # Per group totals broadcast back onto the rows, used for sorting and shares.
+    return df.assign(
+        **{f"{by}_{measure}": df.groupby(by, observed=True)[measure].transform("sum")}
+    )
+
+
+def sort_by_group_total(df, by, measure="total"):
+    # Rows of a group are kept together in order of first appearance before
+    # the sort, the same layout a merge on the group totals produces, so ties
+    # end up in the same order as before.
+    df = add_group_total(df, by, measure)
+    order = df.groupby(by, observed=True, sort=False).ngroup()
+    df = df.iloc[order.argsort(kind="stable")]
+    return df.sort_values(by=f"{by}_{measure}", ascending=False)
+
+
+def keep_top(df, top, by):
+    # The rows of the groups in top, in the order of top.
+    rank = pd.Index(top[by].astype(object)).get_indexer(df[by].astype(object))
+    kept = rank >= 0
+    return df[kept].iloc[np.argsort(rank[kept], kind="stable")]
+
+
+def lump_other(df, by, dims, measures, budget=TRACE_BUDGET, other="Other"):
+    # Keeps the budget - 1 largest groups by the first measure and sums the
+    # rest into one "Other" group, which sorts last.
+    totals = df.groupby(by, observed=True)[measures[0]].sum()
+    if len(totals) <= budget:
+        return df
+    top = set(totals.nlargest(budget - 1).index)
+    categories = [group for group in totals.index if group in top] + [other]
+    labels = pd.Categorical(
+        df[by].astype(object).where(df[by].isin(top), other), categories=categories
+    )
+    return (
+        df.assign(**{by: labels})
+        .groupby(list(dims), observed=True)[measures]
+        .sum()
+        .reset_index()
+    )
+
+
+def as_rollup(data):
+    return data if isinstance(data, Rollup) else Rollup(data)
+
+
+def get_rollup(df, timeframe=None, select=None):
+    key = (df.attrs.get("version"), timeframe)
+    with _cache_lock:
+        if key[0] is not None and key in _cache:
+            _cache.move_to_end(key)
+            count("rollup_cache.hit")
+            return _cache[key]
+
+    count("rollup_cache.miss")
+    rows = df
+    if select is not None:
+        with timed("filter", timeframe=timeframe) as fields:
+            df = select(rows)
+            fields["rows"] = len(df)
+    rollup = Rollup(df, timeframe if select is not None else None, rows)
+    if key[0] is None:
+        return rollup
+    with _cache_lock:
+        _cache[key] = rollup
+        while len(_cache) > ROLLUP_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return rollup
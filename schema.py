@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+from nflcalendar import add_calendar_labels
+
+COLUMNS = [
+    "date",
+    "moment_tier",
+    "player",
+    "team",
+    "season",
+    "week",
+    "play_type",
+    "player_position",
+    "avg_price",
+    "total",
+    "sellers",
+    "buyers",
+    "sales",
+    "price_count",
+    "buyers_hll",
+    "sellers_hll",
+    "price_digest",
+]
+
+DIMENSIONS = ["moment_tier", "player", "team", "play_type", "player_position"]
+
+# Moments without a single player (e.g. a team play) come as "N/A".
+TEAM_PLAY = "Team Play"
+
+
+def rename_values(values, rename):
+    # Renames the categories rather than the rows, values that end up the same
+    # (e.g. "QB" and '"QB"') are merged into one category.
+    renamed = values.cat.categories.map(rename)
+    categories = renamed.unique().sort_values()
+    codes = categories.get_indexer(renamed)
+    row_codes = values.cat.codes.to_numpy()
+    return pd.Series(
+        pd.Categorical.from_codes(
+            np.where(row_codes >= 0, codes[row_codes], -1),
+            categories,
+        ),
+        index=values.index,
+    )
+
+
+def strip_quotes(value):
+    # Variant columns (e.g. the player position) come back JSON quoted.
+    return value.strip('"') if isinstance(value, str) else value
+
+
+def iter_buffers(values):
+    # The numpy buffers behind a column, views included up to the array that
+    # owns the memory.
+    arrays = [values.codes] if isinstance(values, pd.Categorical) else [values]
+    for array in arrays:
+        while isinstance(array, np.ndarray):
+            yield array
+            array = array.base
+
+
+def freeze(df):
+    # The loaded frame is shared by every session and the figure builders take
+    # views of it, so writing through one raises instead of changing the data
+    # for everybody. Arrow backed columns are read only already, the masked
+    # Int16 columns are left as they are.
+    for col in df:
+        for array in iter_buffers(df[col].values):
+            array.flags.writeable = False
+    return df
+
+
+def normalize(df):
+    # Everything the figures used to fix up on every rerun happens once here,
+    # on the fresh frame of a query result.
+    if "player" in df:
+        df["player"] = rename_values(
+            df["player"], lambda player: TEAM_PLAY if player == "N/A" else player
+        )
+    if "player_position" in df:
+        df["player_position"] = rename_values(df["player_position"], strip_quotes)
+    if "date" in df:
+        # Windows are sliced with binary searches on the date (windows.py).
+        if not df["date"].is_monotonic_increasing:
+            df = df.sort_values("date", kind="stable", ignore_index=True)
+        df = add_calendar_labels(df)
+    return freeze(df)
+
+
+def concat_frames(frames):
+    # pd.concat falls back to object columns when categories differ, so union
+    # the categories first.
+    frames = [df for df in frames if not df.empty] or frames[:1]
+    for col in DIMENSIONS:
+        categories = frames[0][col].cat.categories
+        for df in frames[1:]:
+            categories = categories.union(df[col].cat.categories)
+        frames = [
+            df.assign(**{col: df[col].cat.set_categories(categories)}) for df in frames
+        ]
+    return freeze(pd.concat(frames, ignore_index=True))
@@ -1,32 +1,46 @@
 import numpy as np
-import pandas as pd
 
 import plotly.graph_objects as go
 import plotly.express as px
 
 from myutils import human_format
+from rollups import as_rollup, grain, lump_other, sort_by_group_total
 
 
+@grain("moment_tier", "season")
 def get_fig_moment_season(df_daily_sales_ps, val_season):
-    pivotted = (
-        df_daily_sales_ps.groupby(["moment_tier", "season"])
-        .agg({"avg_price": lambda x: np.log(np.mean(x))})
-        .reset_index()
-        .pivot("moment_tier", "season", values="avg_price")
+    df_tier_season = as_rollup(df_daily_sales_ps).get(
+        "moment_tier", "season", estimates=["median_price", "p95_price"]
+    )
+    pivotted = df_tier_season.assign(avg_price=np.log(df_tier_season.avg_price)).pivot(
+        "moment_tier", "season", values="avg_price"
+    )
+    quantiles = np.dstack(
+        [
+            df_tier_season.pivot("moment_tier", "season", values=col).values
+            for col in ("median_price", "p95_price")
+        ]
     )
 
     fig_moment_season = go.Figure(
         data=go.Heatmap(
             z=pivotted.values.tolist(),
-            x=pivotted.columns.tolist(),
+            x=pivotted.columns.astype(str).tolist(),
             y=pivotted.index.tolist(),
             hoverongaps=False,
-            hovertext=[human_format(item) for item in np.exp(pivotted.values).tolist()],
+            hovertext=human_format(np.exp(pivotted.values)),
+            customdata=quantiles.tolist(),
         )
     )
     fig_moment_season.update_traces(
         hovertemplate="<br>".join(
-            ["Season: %{x}", "Tier: %{y}", "Average Price: $ %{hovertext}"]
+            [
+                "Season: %{x}",
+                "Tier: %{y}",
+                "Average Price: $ %{hovertext}",
+                "Median Price: $ %{customdata[0]:,.2f}",
+                "95th Percentile: $ %{customdata[1]:,.2f}",
+            ]
         )
     )
     fig_moment_season.update_layout(
@@ -35,18 +49,23 @@ def get_fig_moment_season(df_daily_sales_ps, val_season):
     return fig_moment_season
 
 
+@grain("season", "week")
 def get_fig_week_season(df, val):
-    df_1 = df.groupby(["season", "week"]).sum().reset_index()
-    df_1 = df_1.sort_values(by="total", ascending=False)
-    df_1 = pd.merge(
-        df_1, df_1.groupby(["week"]).sum().reset_index(), on="week"
-    ).sort_values(by="total_y", ascending=False)
+    # Integer columns would get a continuous color scale and a numeric axis,
+    # seasons beyond the trace budget are summed into "Other".
+    df_1 = lump_other(
+        as_rollup(df).get("season", "week").astype({"season": str, "week": str}),
+        "season",
+        ["season", "week"],
+        ["total"],
+    )
+    df_1 = sort_by_group_total(df_1.sort_values(by="total", ascending=False), "week")
     fig_week_season = px.bar(
         df_1,
         x="week",
-        y="total_x",
+        y="total",
         color="season",
-        labels=dict(week="Week", total_x="Sales (USD)"),
+        labels=dict(week="Week", total="Sales (USD)"),
         title=f"Which weeks produced the best moments which were bought {val}..",
     )
     return fig_week_season
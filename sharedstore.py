@@ -0,0 +1,189 @@
+import fcntl
+import json
+import os
+from datetime import timedelta
+from functools import partial
+
+import pandas as pd
+import pyarrow as pa
+
+from arrowdecode import table_to_frame
+from ingest import IncrementalLoader
+from refresher import REFRESH_AHEAD, Refresher
+from schema import COLUMNS
+
+SHARED_DIR = os.getenv("SHARED_DIR", ".shared")
+SHARED_KEEP = int(os.getenv("SHARED_KEEP", 3))
+LATEST_FILE = "LATEST"
+LOCK_FILE = ".refresh.lock"
+META_KEY = b"nflallday"
+
+
+def get_version_path(root, version):
+    return os.path.join(root, f"{version}.arrow")
+
+
+def list_versions(root=SHARED_DIR):
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        name[: -len(".arrow")] for name in os.listdir(root) if name.endswith(".arrow")
+    )
+
+
+def get_latest_version(root=SHARED_DIR):
+    try:
+        with open(os.path.join(root, LATEST_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def replace_file(path, write):
+    # Readers only ever see the old or the new file, never half of one.
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def write_version(df, watermark, refreshed_at, root=SHARED_DIR, keep=SHARED_KEEP):
+    version = refreshed_at.strftime("%Y%m%dT%H%M%S%f")
+    os.makedirs(root, exist_ok=True)
+    # One record batch with one dictionary per column, the IPC file format
+    # has no dictionary replacement across batches.
+    if not df["date"].is_monotonic_increasing:
+        # Readers map the rows as they are, sorted rows need no copy.
+        df = df.sort_values("date", kind="stable")
+    table = pa.Table.from_pandas(df, columns=COLUMNS, preserve_index=False)
+    table = table.unify_dictionaries().combine_chunks()
+    meta = dict(
+        version=version,
+        watermark=watermark.strftime("%Y-%m-%d"),
+        refreshed_at=refreshed_at.isoformat(),
+        rows=len(df),
+    )
+    table = table.replace_schema_metadata(
+        {**(table.schema.metadata or {}), META_KEY: json.dumps(meta)}
+    )
+
+    def write_table(path):
+        with pa.OSFile(path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+    def write_pointer(path):
+        with open(path, "w") as f:
+            f.write(version)
+
+    replace_file(get_version_path(root, version), write_table)
+    replace_file(os.path.join(root, LATEST_FILE), write_pointer)
+    prune_versions(root, keep)
+    return version
+
+
+def read_version(version, root=SHARED_DIR):
+    # The numeric columns stay views on the page cache, so every process on
+    # the host shares one copy. The mapping is read only.
+    source = pa.memory_map(get_version_path(root, version), "r")
+    table = pa.ipc.open_file(source).read_all()
+    if not set(COLUMNS) <= set(table.column_names):
+        # Written before a column was added, the next refresh replaces it.
+        return None
+    meta = json.loads(table.schema.metadata[META_KEY])
+    df = table_to_frame(table)
+    refreshed_at = pd.Timestamp(meta["refreshed_at"])
+    df.attrs["version"] = refreshed_at.isoformat()
+    return dict(
+        df=df,
+        watermark=pd.Timestamp(meta["watermark"]),
+        refreshed_at=refreshed_at,
+        version=version,
+    )
+
+
+def prune_versions(root=SHARED_DIR, keep=SHARED_KEEP):
+    # Processes that still map a removed version keep reading it, the file is
+    # only gone once they unmap it.
+    for version in list_versions(root)[:-keep]:
+        try:
+            os.remove(get_version_path(root, version))
+        except FileNotFoundError:
+            pass
+
+
+def is_stale(refreshed_at, ttl):
+    return pd.Timestamp.now(tz="UTC") - refreshed_at > timedelta(seconds=ttl)
+
+
+class SharedStore:
+    def __init__(
+        self, run_query, root=SHARED_DIR, keep=SHARED_KEEP, refresher=None, key="shared"
+    ):
+        self.root = root
+        self.keep = keep
+        self.refresher = refresher or Refresher()
+        self.key = key
+        self.loader = IncrementalLoader(
+            run_query, on_refresh=self.write, refresher=self.refresher
+        )
+        self._mapped = None
+
+    def write(self, df, watermark, refreshed_at, first_open_date=None, previous=None):
+        # One mapped file per version, it is written whole.
+        return write_version(df, watermark, refreshed_at, self.root, self.keep)
+
+    def read_latest(self):
+        version = get_latest_version(self.root)
+        if version is None:
+            return None
+        mapped = self._mapped
+        if mapped is None or mapped["version"] != version:
+            mapped = self._mapped = read_version(version, self.root)
+        return mapped
+
+    def refresh(self, ttl, blocking=True):
+        # The process holding the lock is the refresher, the others keep
+        # serving the current version (or wait for the first one).
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, LOCK_FILE), "a") as lock_file:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(lock_file, flags)
+            except BlockingIOError:
+                return False
+            snapshot = self.read_latest()
+            if snapshot is not None and not is_stale(snapshot["refreshed_at"], ttl):
+                return False
+            if (
+                snapshot is not None
+                and snapshot["refreshed_at"] != self.loader.refreshed_at
+            ):
+                self.loader.restore(snapshot)
+            self.loader.refresh()
+            # Drops the private copy the merge built for the mapped one.
+            self.loader.restore(self.read_latest())
+            return True
+
+    def schedule(self, ttl, ahead=REFRESH_AHEAD):
+        # Every process runs the job, the one that gets the lock refreshes once
+        # the version is older than the interval, the others find it fresh.
+        interval = ttl * ahead
+        snapshot = self.read_latest()
+        delay = 0
+        if snapshot is not None:
+            age = pd.Timestamp.now(tz="UTC") - snapshot["refreshed_at"]
+            delay = interval - age.total_seconds()
+        self.refresher.schedule(
+            self.key, partial(self.refresh, interval, blocking=False), interval, delay
+        )
+
+    def get(self, ttl):
+        snapshot = self.read_latest()
+        if snapshot is None:
+            self.refresher.run(self.key, partial(self.refresh, ttl))
+            snapshot = self.read_latest()
+        elif is_stale(snapshot["refreshed_at"], ttl):
+            self.refresher.run_in_background(
+                self.key, partial(self.refresh, ttl, blocking=False)
+            )
+        return snapshot["df"]
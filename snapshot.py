@@ -0,0 +1,146 @@
+import json
+import os
+import shutil
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from arrowdecode import table_to_frame
+from perf import timed
+from schema import COLUMNS
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", ".snapshots")
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", 3))
+
+# Leading underscore keeps the parquet dataset discovery from reading it.
+META_FILE = "_snapshot.json"
+
+
+def list_snapshots(root=SNAPSHOT_DIR):
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        name
+        for name in os.listdir(root)
+        if not name.startswith(".")
+        and os.path.isfile(os.path.join(root, name, META_FILE))
+    )
+
+
+def get_version(refreshed_at):
+    return refreshed_at.strftime("%Y%m%dT%H%M%S%f")
+
+
+def write_snapshot(
+    df,
+    watermark,
+    refreshed_at,
+    first_open_date=None,
+    previous=None,
+    root=SNAPSHOT_DIR,
+    keep=SNAPSHOT_KEEP,
+):
+    version = get_version(refreshed_at)
+    rows = len(df)
+    # Written to a hidden directory first so readers never see half a snapshot.
+    tmp_path = os.path.join(root, f".tmp-{version}")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+
+    # After an incremental refresh the days before first_open_date are the
+    # ones of the previous snapshot, their partitions are linked instead of
+    # written again, so a snapshot costs the reopened days.
+    if first_open_date is not None and link_partitions(
+        os.path.join(root, get_version(previous)) if previous else None,
+        tmp_path,
+        first_open_date,
+    ):
+        df = df[df.date >= first_open_date]
+
+    # from_pandas wraps the numeric columns without copying them. The calendar
+    # labels are derived, they are added again on read.
+    table = pa.Table.from_pandas(df, columns=COLUMNS, preserve_index=False)
+    date_index = table.schema.get_field_index("date")
+    table = table.set_column(date_index, "date", pc.cast(table["date"], pa.date32()))
+    pq.write_to_dataset(table, tmp_path, partition_cols=["date"])
+    with open(os.path.join(tmp_path, META_FILE), "w") as f:
+        json.dump(
+            dict(
+                version=version,
+                watermark=watermark.strftime("%Y-%m-%d"),
+                refreshed_at=refreshed_at.isoformat(),
+                rows=rows,
+                columns=COLUMNS,
+            ),
+            f,
+        )
+    os.replace(tmp_path, os.path.join(root, version))
+    prune_snapshots(root, keep)
+    return version
+
+
+def link_partitions(path, tmp_path, first_open_date):
+    # Hard links the date partitions of the snapshot at path before
+    # first_open_date into tmp_path. False when there is no such snapshot
+    # (e.g. it was pruned) or it has other columns, it is written whole then.
+    try:
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+    except (TypeError, OSError):
+        return False
+    if meta.get("columns") != COLUMNS:
+        return False
+    first_open = f"date={pd.Timestamp(first_open_date):%Y-%m-%d}"
+    try:
+        for name in os.listdir(path):
+            if not name.startswith("date=") or name >= first_open:
+                continue
+            os.makedirs(os.path.join(tmp_path, name))
+            for file in os.listdir(os.path.join(path, name)):
+                os.link(
+                    os.path.join(path, name, file), os.path.join(tmp_path, name, file)
+                )
+    except OSError:
+        # Pruned while linking, or a file system without hard links.
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        return False
+    return True
+
+
+def read_snapshot(version, root=SNAPSHOT_DIR):
+    path = os.path.join(root, version)
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    table = pq.read_table(path)
+    if not set(COLUMNS) <= set(table.column_names):
+        # Written before a column was added, a full load replaces it.
+        return None
+    # The date is the partition key, it comes back as a string dictionary.
+    dates = pc.cast(pc.cast(table["date"], pa.string()), pa.timestamp("ns"))
+    table = table.set_column(table.schema.get_field_index("date"), "date", dates)
+    with timed("decode", rows=table.num_rows):
+        df = table_to_frame(table.select(COLUMNS))
+    return dict(
+        df=df,
+        watermark=pd.Timestamp(meta["watermark"]),
+        refreshed_at=pd.Timestamp(meta["refreshed_at"]),
+    )
+
+
+def read_latest_snapshot(root=SNAPSHOT_DIR):
+    versions = list_snapshots(root)
+    if not versions:
+        return None
+    return read_snapshot(versions[-1], root)
+
+
+def prune_snapshots(root=SNAPSHOT_DIR, keep=SNAPSHOT_KEEP):
+    for version in list_snapshots(root)[:-keep]:
+        shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+    # Leftovers of writes that died half way.
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name.startswith(".tmp-") and time.time() - os.path.getmtime(path) > 3600:
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,100 @@
+import numpy as np
+import pyarrow as pa
+
+from hll import from_buffers, get_entries, get_lists, to_binary, to_structs
+
+# Centroids a merged digest keeps at most (plus one), more near the tails.
+COMPRESSION = 100
+# A digest is a list of (mean, weight) centroids sorted by mean, stored like
+# the HLL sketches in an Arrow backed binary column.
+DIGEST_DTYPE = np.dtype([("mean", "<f8"), ("weight", "<f8")])
+# Digest column -> the quantiles rollups add for it.
+DIGESTS = {"price_digest": {"median_price": 0.5, "p95_price": 0.95}}
+# The APPROX_PERCENTILE_ACCUMULATE field the digests are decoded from.
+EXPORT_TYPE = pa.struct([("state", pa.list_(pa.float64()))])
+
+
+def from_exports(values):
+    # APPROX_PERCENTILE_ACCUMULATE states are {"state": [mean, weight, ...]}.
+    # The digests of a whole column are decoded at once like
+    # hll.from_exports, the centroids of every row sorted by mean.
+    (state,) = to_structs(values, EXPORT_TYPE).flatten()
+    state, sizes = get_lists(state)
+    state = state.reshape(-1, 2)
+    counts = sizes // 2
+    rows = np.repeat(np.arange(len(counts)), counts)
+    order = np.lexsort((state[:, 0], rows))
+    digest = np.empty(len(order), DIGEST_DTYPE)
+    digest["mean"] = state[order, 0]
+    digest["weight"] = state[order, 1]
+    offsets = np.concatenate([[0], np.cumsum(counts)]) * DIGEST_DTYPE.itemsize
+    return to_binary(offsets, digest.view(np.uint8))
+
+
+def to_export(digest):
+    entries = np.frombuffer(digest or b"", DIGEST_DTYPE)
+    state = np.column_stack([entries["mean"], entries["weight"]]).ravel()
+    return dict(state=state.tolist(), type="tdigest", version=1)
+
+
+def get_quantiles(means, weights, counts, quantiles):
+    # Interpolates between the centroid midpoints. The centroids of all groups
+    # are in one array sorted by group and mean, counts[g] of them in group g.
+    values = {q: np.full(len(counts), np.nan) for q in quantiles}
+    found = counts > 0
+    if not found.any():
+        return values
+    ends = np.cumsum(counts)[found]
+    starts = ends - counts[found]
+    before = np.cumsum(weights) - weights
+    mids = before + weights / 2
+    totals = np.add.reduceat(weights, starts)
+    for q in quantiles:
+        targets = before[starts] + q * totals
+        # The two centroids around the target, both within the group.
+        upper = np.searchsorted(mids, targets, "right")
+        upper = np.minimum(np.maximum(upper, starts + 1), ends - 1)
+        lower = np.maximum(upper - 1, starts)
+        span = mids[upper] - mids[lower]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            share = np.clip((targets - mids[lower]) / span, 0, 1)
+        values[q][found] = np.where(
+            span > 0, means[lower] + share * (means[upper] - means[lower]), means[lower]
+        )
+    return values
+
+
+def merge_digests(digests, groups, n_groups, quantiles=(), compression=COMPRESSION):
+    # Merged digests and quantiles per group, like hll.merge_sketches. The
+    # centroids of a group are sorted and those that fall into the same step
+    # of the k1 scale (arcsin of the quantile) are merged, so a digest keeps
+    # at most compression + 1 centroids with single values at the tails.
+    entries, sizes = get_entries(digests, DIGEST_DTYPE)
+    rows = np.repeat(np.asarray(groups, dtype=np.int64), sizes)
+    valid = rows >= 0
+    rows, entries = rows[valid], entries[valid]
+    order = np.lexsort((entries["mean"], rows))
+    rows, means, weights = rows[order], entries["mean"][order], entries["weight"][order]
+
+    if len(rows):
+        totals = np.bincount(rows, weights=weights, minlength=n_groups)
+        before = np.cumsum(weights) - weights
+        group_before = before[np.searchsorted(rows, rows, "left")]
+        q = (before - group_before + weights / 2) / totals[rows]
+        steps = np.floor(compression * (np.arcsin(2 * q - 1) / np.pi + 0.5))
+        keys = rows * (compression + 1) + steps.astype(np.int64)
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+        bounds = np.flatnonzero(first)
+        rows = rows[bounds]
+        merged_weights = np.add.reduceat(weights, bounds)
+        means = np.add.reduceat(means * weights, bounds) / merged_weights
+        weights = merged_weights
+
+    counts = np.bincount(rows, minlength=n_groups)
+    merged_entries = np.empty(len(rows), DIGEST_DTYPE)
+    merged_entries["mean"] = means
+    merged_entries["weight"] = weights
+    offsets = np.concatenate([[0], np.cumsum(counts)]) * DIGEST_DTYPE.itemsize
+    merged = from_buffers(offsets, merged_entries.view(np.uint8))
+    return merged, get_quantiles(means, weights, counts, quantiles)
@@ -1,32 +1,46 @@
 import numpy as np
-import pandas as pd
 
 import plotly.graph_objects as go
 import plotly.express as px
 
-from myutils import human_format
+from myutils import format_currency, human_format
+from rollups import as_rollup, grain, sort_by_group_total
 
 
+@grain("season", "team")
 def get_fig_team_season(df_daily_sales_ps, val_team):
-    pivotted = (
-        df_daily_sales_ps.groupby(["season", "team"])
-        .agg({"avg_price": lambda x: np.log(np.mean(x))})
-        .reset_index()
-        .pivot("season", "team", values="avg_price")
+    df_season_team = as_rollup(df_daily_sales_ps).get(
+        "season", "team", estimates=["median_price", "p95_price"]
+    )
+    pivotted = df_season_team.assign(avg_price=np.log(df_season_team.avg_price)).pivot(
+        "season", "team", values="avg_price"
+    )
+    quantiles = np.dstack(
+        [
+            df_season_team.pivot("season", "team", values=col).values
+            for col in ("median_price", "p95_price")
+        ]
     )
 
     fig_team_season_avg = go.Figure(
         data=go.Heatmap(
             z=pivotted.values.tolist(),
             x=pivotted.columns.tolist(),
-            y=pivotted.index.tolist(),
+            y=pivotted.index.astype(str).tolist(),
             hoverongaps=False,
             hovertext=np.exp(pivotted.values).tolist(),
+            customdata=quantiles.tolist(),
         ),
     )
     fig_team_season_avg.update_traces(
         hovertemplate="<br>".join(
-            ["Team: %{x}", "Season: %{y}", "Average Price: $ %{hovertext:.2f}"]
+            [
+                "Team: %{x}",
+                "Season: %{y}",
+                "Average Price: $ %{hovertext:.2f}",
+                "Median Price: $ %{customdata[0]:.2f}",
+                "95th Percentile: $ %{customdata[1]:.2f}",
+            ]
         )
     )
     # st.subheader("Which team had priceless moments")
@@ -41,27 +55,27 @@ def get_fig_team_season(df_daily_sales_ps, val_team):
     return fig_team_season_avg
 
 
+@grain("team", "moment_tier")
 def get_fig_moment(df_daily_sales_ps, val_team):
-    df_daily_sales_ps_moment = (
-        df_daily_sales_ps.groupby(["team", "moment_tier"])
-        .sum()
-        .reset_index()
-        .sort_values(by="total", ascending=False)
+    df_daily_sales_ps_moment = sort_by_group_total(
+        as_rollup(df_daily_sales_ps)
+        .get("team", "moment_tier")
+        .sort_values(by="total", ascending=False),
+        "team",
+    )
+    df_daily_sales_ps_moment = df_daily_sales_ps_moment.assign(
+        total_text=format_currency(df_daily_sales_ps_moment.total)
     )
-    df_daily_sales_ps_moment = pd.merge(
-        df_daily_sales_ps_moment,
-        df_daily_sales_ps_moment.groupby(["team"]).sum().reset_index(),
-        # .nlargest(50, columns="total"),
-        on="team",
-    ).sort_values(by="total_y", ascending=False)
 
     fig_moment = px.bar(
         df_daily_sales_ps_moment,
         x="team",
-        y="total_x",
+        y="total",
         color="moment_tier",
-        text="total_x",
-        labels=dict(team="Team", moment_tier="Tier", total_x="Volume (USD)"),
+        text="total_text",
+        labels=dict(
+            team="Team", moment_tier="Tier", total="Volume (USD)", total_text="Volume"
+        ),
         category_orders={"team": df_daily_sales_ps_moment["team"].to_list()},
     )
     fig_moment.update_layout(title=f"Teams sales based on moment tier {val_team}")
@@ -71,21 +85,20 @@ def get_fig_moment(df_daily_sales_ps, val_team):
     return fig_moment
 
 
+@grain("team", "season")
 def get_fig_team_season_total(df_daily_sales_ps, val_team):
-    pivotted = (
-        df_daily_sales_ps.groupby(["team", "season"])
-        .agg({"total": lambda x: np.log(np.sum(x))})
-        .reset_index()
-        .pivot("season", "team", values="total")
+    df_team_season = as_rollup(df_daily_sales_ps).get("team", "season")
+    pivotted = df_team_season.assign(total=np.log(df_team_season.total)).pivot(
+        "season", "team", values="total"
     )
 
     fig_team_season_tot = go.Figure(
         data=go.Heatmap(
             z=pivotted.values.tolist(),
             x=pivotted.columns.tolist(),
-            y=pivotted.index.tolist(),
+            y=pivotted.index.astype(str).tolist(),
             hoverongaps=False,
-            hovertext=[human_format(item) for item in np.exp(pivotted.values).tolist()],
+            hovertext=human_format(np.exp(pivotted.values)),
         )
     )
 
@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the root of the repository, where app.py imports them.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def sales():
+    from benchmarks.generator import generate_sales
+
+    return generate_sales(20_000, seed=7)
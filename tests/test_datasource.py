@@ -0,0 +1,78 @@
+import threading
+
+import pytest
+
+from datasource import (
+    QueryResult,
+    RecordingSource,
+    ReplaySource,
+    fetch_all,
+    fetch_pages,
+)
+
+
+class FakeSource:
+    # Serves rows in pages of at most max_page_size, with or without the row
+    # count ShroomDK reports in its run stats.
+    def __init__(self, n_rows, max_page_size=None, with_total=True):
+        self.rows = [[i, f"wallet {i}"] for i in range(n_rows)]
+        self.max_page_size = max_page_size
+        self.with_total = with_total
+        self.pages = []
+        self._lock = threading.Lock()
+
+    def query(self, sql, page_size=100, page_number=1):
+        with self._lock:
+            self.pages.append(page_number)
+        page_size = min(page_size, self.max_page_size or page_size)
+        start = (page_number - 1) * page_size
+        return QueryResult(
+            ["ID", "WALLET"],
+            self.rows[start : start + page_size],
+            len(self.rows) if self.with_total else None,
+        )
+
+
+def decode(columns, rows):
+    return [row[0] for row in rows]
+
+
+@pytest.mark.parametrize("n_rows", [0, 1, 99, 100, 101, 1000, 1234])
+@pytest.mark.parametrize("max_page_size", [None, 30])
+@pytest.mark.parametrize("with_total", [True, False])
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_pages_come_back_whole_and_in_order(
+    n_rows, max_page_size, with_total, max_workers
+):
+    source = FakeSource(n_rows, max_page_size, with_total)
+    chunks = fetch_pages(source, "", decode, page_size=100, max_workers=max_workers)
+    assert [i for chunk in chunks for i in chunk] == list(range(n_rows))
+    assert all(chunks[:-1])
+
+
+def test_pages_are_not_fetched_past_the_row_count():
+    source = FakeSource(1000, max_page_size=30)
+    fetch_pages(source, "", decode, page_size=100)
+    assert sorted(source.pages) == list(range(1, 35))
+
+
+def test_fetch_all():
+    for n_rows in [0, 100, 250]:
+        for with_total in [True, False]:
+            source = FakeSource(n_rows, 30, with_total)
+            result = fetch_all(source, "", page_size=100)
+            assert result.columns == ["id", "wallet"]
+            assert result.rows == source.rows
+            assert result.total_rows == n_rows
+
+
+def test_replays_of_a_recording(tmp_path):
+    source = FakeSource(250)
+    RecordingSource(source, root=str(tmp_path)).query("select  1", page_size=100)
+    # The recording is replayed with any page size and indentation.
+    replay = ReplaySource(root=str(tmp_path), page_size=40)
+    chunks = fetch_pages(replay, "select 1", decode, page_size=100)
+    assert [i for chunk in chunks for i in chunk] == list(range(250))
+    assert replay.query("select 1").records[0] == {"id": 0, "wallet": "wallet 0"}
+    with pytest.raises(LookupError):
+        replay.query("select 2")
@@ -0,0 +1,201 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from daily_trends import get_daily_team_fig, get_daily_trends
+from player_trends import (
+    get_fig_moment_player_position,
+    get_fig_moment_playtype,
+    get_fig_player_seasons,
+    get_fig_player_seasons_price,
+)
+from rollups import TRACE_BUDGET, Rollup
+from seasonal_trends import get_fig_moment_season, get_fig_week_season
+from team_trends import get_fig_moment, get_fig_team_season, get_fig_team_season_total
+from windows import select_window
+
+# The figures' data against the aggregations the trend modules used to run,
+# per group lambdas over the rows of the timeframe.
+WINDOWS = [None, ("2022-09-01", "2022-10-15"), ("2022-08-20", "2022-08-20")]
+
+
+def sum_of(x):
+    return np.sum(x.to_numpy(dtype=np.float64))
+
+
+def aggregate(df, by):
+    grouped = df.groupby(by, observed=True).agg(
+        {"total": lambda x: sum_of(x), "price_count": lambda x: sum_of(x)}
+    )
+    return grouped.assign(avg_price=grouped.total / grouped.price_count)
+
+
+def lump(df, by, totals, budget=TRACE_BUDGET, other="Other"):
+    # Keeps the budget - 1 largest groups of totals, the rest become "Other".
+    if len(totals) <= budget:
+        return df
+    top = set(totals.sort_values(ascending=False).index[: budget - 1])
+    return df.assign(**{by: [key if key in top else other for key in df[by]]})
+
+
+def rank(totals, n):
+    # Largest first, ties by name like the leaderboards.
+    ranked = totals.reset_index().sort_values(
+        [totals.name, totals.index.name], ascending=[False, True]
+    )
+    return [str(key) for key in ranked[totals.index.name][:n]]
+
+
+def bar_values(fig):
+    return {
+        (str(trace.name), str(x)): float(y)
+        for trace in fig.data
+        for x, y in zip(trace.x, trace.y)
+    }
+
+
+def heatmap_values(fig):
+    trace = fig.data[0]
+    return {
+        (str(y), str(x)): z
+        for y, row in zip(trace.y, trace.z)
+        for x, z in zip(trace.x, row)
+        if z is not None and not np.isnan(z)
+    }
+
+
+def assert_values(actual, expected):
+    assert set(actual) == set(expected)
+    keys = sorted(expected)
+    np.testing.assert_allclose(
+        [actual[key] for key in keys], [expected[key] for key in keys], rtol=1e-5
+    )
+
+
+def to_values(series):
+    return {
+        tuple(str(key) for key in np.atleast_1d(index)): float(value)
+        for index, value in series.items()
+    }
+
+
+def get_rows(sales, window):
+    if window is None:
+        return sales
+    start, end = pd.Timestamp(window[0]), pd.Timestamp(window[1])
+    return sales[(sales.date >= start) & (sales.date <= end)]
+
+
+@pytest.fixture(params=WINDOWS, ids=str)
+def timeframe(request, sales):
+    # What the app hands the builders: a rollup of the window's rows that can
+    # rank from the leaderboards of all the rows.
+    window = request.param
+    return Rollup(select_window(sales, window), window, sales), get_rows(sales, window)
+
+
+def test_player_seasons(timeframe):
+    rollup, rows = timeframe
+    players = rank(aggregate(rows, "player").total, 50)
+    top = rows[rows.player.astype(str).isin(players)].astype(
+        {"player": str, "season": str}
+    )
+    top = lump(top, "season", aggregate(top, "season").total)
+    expected = aggregate(top, ["season", "player"]).total
+
+    fig = get_fig_player_seasons(rollup, "")
+    assert_values(bar_values(fig), to_values(expected))
+    assert list(fig.layout.xaxis.categoryarray) == players
+
+
+def test_player_seasons_price(timeframe):
+    rollup, rows = timeframe
+    players = rank(aggregate(rows, "player").avg_price, 50)
+    top = rows[rows.player.astype(str).isin(players)]
+    expected = aggregate(top, ["player_position", "player"]).avg_price
+
+    fig = get_fig_player_seasons_price(rollup, "")
+    assert_values(bar_values(fig), to_values(expected))
+    assert list(fig.layout.xaxis.categoryarray) == players
+
+
+def test_moment_playtype(timeframe):
+    rollup, rows = timeframe
+    expected = aggregate(rows, ["moment_tier", "play_type"]).total
+    assert_values(bar_values(get_fig_moment_playtype(rollup, "")), to_values(expected))
+
+
+def test_moment_player_position(timeframe):
+    rollup, rows = timeframe
+    expected = aggregate(rows, ["play_type", "player_position"]).avg_price
+    assert_values(
+        bar_values(get_fig_moment_player_position(rollup, "")), to_values(expected)
+    )
+
+
+def test_moment(timeframe):
+    rollup, rows = timeframe
+    expected = aggregate(rows, ["moment_tier", "team"]).total
+    teams = rank(aggregate(rows, "team").total, None)
+
+    fig = get_fig_moment(rollup, "")
+    assert_values(bar_values(fig), to_values(expected))
+    assert list(dict.fromkeys(fig.layout.xaxis.categoryarray)) == teams
+
+
+def test_team_season(timeframe):
+    rollup, rows = timeframe
+    expected = np.log(aggregate(rows, ["season", "team"]).avg_price)
+    assert_values(heatmap_values(get_fig_team_season(rollup, "")), to_values(expected))
+
+
+def test_team_season_total(timeframe):
+    rollup, rows = timeframe
+    expected = np.log(aggregate(rows, ["season", "team"]).total)
+    assert_values(
+        heatmap_values(get_fig_team_season_total(rollup, "")), to_values(expected)
+    )
+
+
+def test_moment_season(timeframe):
+    rollup, rows = timeframe
+    expected = np.log(aggregate(rows, ["moment_tier", "season"]).avg_price)
+    assert_values(
+        heatmap_values(get_fig_moment_season(rollup, "")), to_values(expected)
+    )
+
+
+def test_week_season(timeframe):
+    rollup, rows = timeframe
+    rows = rows.astype({"season": str, "week": str})
+    rows = lump(rows, "season", aggregate(rows, "season").total)
+    expected = aggregate(rows, ["season", "week"]).total
+    assert_values(bar_values(get_fig_week_season(rollup, "")), to_values(expected))
+
+
+def test_daily_trends(sales):
+    fig = get_daily_trends(Rollup(sales).get("date"))
+    daily = sales.groupby("date").agg(
+        {"total": lambda x: sum_of(x), "sales": lambda x: sum_of(x)}
+    )
+    for trace, col in zip(fig.data, ["total", "sales"]):
+        assert list(pd.to_datetime(trace.x)) == list(daily.index)
+        np.testing.assert_allclose(trace.y, daily[col], rtol=1e-5)
+
+
+def test_daily_team_fig(sales):
+    rows = lump(sales.astype({"team": str}), "team", aggregate(sales, "team").total)
+    totals = aggregate(rows, ["team", "date"]).total
+    shares = totals * 100 / totals.groupby(level="date").transform("sum")
+    expected = {
+        (team, str(pd.Timestamp(date).date())): value
+        for (team, date), value in shares.items()
+    }
+
+    fig = get_daily_team_fig(Rollup(sales))
+    actual = {
+        (trace.name, str(pd.Timestamp(x).date())): float(y)
+        for trace in fig.data
+        for x, y in zip(trace.x, trace.y)
+    }
+    assert_values(actual, expected)
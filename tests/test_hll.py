@@ -0,0 +1,84 @@
+import json
+
+import numpy as np
+import pytest
+
+from benchmarks.generator import hash_wallets
+from hll import (
+    REGISTERS,
+    SKETCH_DTYPE,
+    from_exports,
+    merge_sketches,
+    to_export,
+)
+
+
+def get_sketch(wallets):
+    # The sparse sketch HLL_ACCUMULATE keeps for the wallets, the max rank per
+    # register.
+    index, rank = hash_wallets(np.asarray(wallets))
+    registers = np.zeros(REGISTERS, dtype=np.uint8)
+    np.maximum.at(registers, index, rank)
+    filled = np.flatnonzero(registers)
+    sketch = np.empty(len(filled), SKETCH_DTYPE)
+    sketch["index"] = filled
+    sketch["rank"] = registers[filled]
+    return sketch.tobytes()
+
+
+def test_merge_is_the_sketch_of_the_union():
+    rng = np.random.default_rng(1)
+    rows = [rng.choice(50_000, rng.integers(0, 300)) for _ in range(200)]
+    groups = rng.integers(0, 3, len(rows))
+
+    merged, _ = merge_sketches([get_sketch(row) for row in rows], groups, 3)
+    for group in range(3):
+        union = np.concatenate([row for row, g in zip(rows, groups) if g == group])
+        assert merged[group] == get_sketch(union)
+
+
+@pytest.mark.parametrize("distinct", [1, 10, 300, 5_000, 100_000])
+def test_estimates_are_within_the_standard_error(distinct):
+    # 1.6% standard error, three of them for every group.
+    rng = np.random.default_rng(distinct)
+    wallets = rng.permutation(10**7)[:distinct]
+    # Every wallet shows up in a few rows.
+    rows = np.array_split(np.concatenate([wallets] * 3), 40)
+
+    _, estimates = merge_sketches([get_sketch(row) for row in rows], [0] * 40, 1)
+    assert estimates[0] == pytest.approx(distinct, rel=0.05, abs=1)
+
+
+def test_groups_outside_are_left_out():
+    sketches = [get_sketch(np.arange(100)), get_sketch(np.arange(100, 200))]
+    merged, estimates = merge_sketches(sketches, [-1, 1], 2)
+    assert merged[0] == b""
+    assert estimates[0] == 0
+    assert merged[1] == sketches[1]
+
+
+def test_export_round_trip():
+    # Query pages carry the exports as objects or as their JSON, maybe
+    # printed across lines, a column is decoded at once.
+    sketches = [get_sketch(np.arange(n, 3 * n)) for n in range(0, 300, 7)]
+    dense = np.zeros(REGISTERS, dtype=int)
+    entries = np.frombuffer(sketches[3], SKETCH_DTYPE)
+    dense[entries["index"]] = entries["rank"]
+    exports = [to_export(sketch) for sketch in sketches] + [
+        {"precision": 12, "dense": dense.tolist()},
+        None,
+        "",
+    ]
+    expected = sketches + [sketches[3], b"", b""]
+    for values in [
+        exports,
+        [json.dumps(value, indent=2) if value else value for value in exports],
+        [json.dumps(value).encode() if value else value for value in exports],
+    ]:
+        assert from_exports(values).to_pylist() == expected
+    assert from_exports([]).to_pylist() == []
+
+
+def test_other_precisions_are_rejected():
+    with pytest.raises(ValueError):
+        from_exports([None, {"precision": 14, "dense": []}])
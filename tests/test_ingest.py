@@ -0,0 +1,81 @@
+import re
+
+import pandas as pd
+import pytest
+
+from ingest import TIMEZONE, IncrementalLoader, merge_delta
+from leaderboard import LEADERBOARD_DIMS, build_leaderboards, get_leaderboards
+
+
+def assert_same_rows(actual, expected):
+    # Same rows, whatever order the categories were concatenated in.
+    def to_str(df):
+        categories = df.select_dtypes("category").columns
+        return df.reset_index(drop=True).astype({col: str for col in categories})
+
+    actual, expected = to_str(actual), to_str(expected)
+    assert list(actual.dtypes) == list(expected.dtypes)
+    assert actual.equals(expected)
+
+
+def test_merge_delta_replaces_the_open_days(sales):
+    first_open = pd.Timestamp("2022-10-01")
+    df = sales[sales.date < pd.Timestamp("2022-10-05")]
+    # The delta has changed since: rows were added to the open days.
+    delta = sales[sales.date >= first_open]
+    merged = merge_delta(df, delta, first_open)
+    assert_same_rows(merged, sales)
+    assert not merged.player.cat.categories.duplicated().any()
+
+
+def test_merge_delta_keeps_the_frame_without_a_delta(sales):
+    assert merge_delta(sales, sales[:0], pd.Timestamp("2022-10-01")) is sales
+
+
+class FakeWarehouse:
+    # Answers the daily sales query from the rows loaded up to now, starting
+    # at the New York day of its since.
+    def __init__(self, sales):
+        self.sales = sales
+        self.until = None
+        self.queries = []
+
+    def run_query(self, sql):
+        since = pd.Timestamp(re.search(r">= '(.*)'", sql).group(1), tz="UTC")
+        self.queries.append(since)
+        day = since.tz_convert(TIMEZONE).tz_localize(None).normalize()
+        df = self.sales[(self.sales.date >= day) & (self.sales.date <= self.until)]
+        return df.reset_index(drop=True)
+
+
+@pytest.mark.parametrize("lookback_days", [0, 1, 3])
+def test_refreshes_only_fetch_the_open_days(sales, lookback_days):
+    warehouse = FakeWarehouse(sales)
+    loader = IncrementalLoader(warehouse.run_query, lookback_days=lookback_days)
+    for day in pd.date_range("2022-09-01", "2022-09-06"):
+        warehouse.until = day
+        now = (day + pd.Timedelta(hours=12)).tz_localize(TIMEZONE).tz_convert("UTC")
+        df = loader.refresh(now)
+        assert loader.watermark == day - pd.Timedelta(days=1)
+        assert_same_rows(df, sales[sales.date <= day])
+        assert df.attrs["version"] == now.isoformat()
+
+    # The last refresh started from the watermark of the one before.
+    first_open = pd.Timestamp("2022-09-05") - pd.Timedelta(days=lookback_days)
+    assert warehouse.queries[-1].tz_convert(TIMEZONE).tz_localize(None) == first_open
+
+
+def test_refreshes_carry_the_leaderboards_forward(sales):
+    warehouse = FakeWarehouse(sales)
+    loader = IncrementalLoader(warehouse.run_query)
+    warehouse.until = pd.Timestamp("2022-09-30")
+    get_leaderboards(loader.refresh(pd.Timestamp("2022-10-01 12:00", tz="UTC")))
+
+    warehouse.until = pd.Timestamp("2022-10-10")
+    df = loader.refresh(pd.Timestamp("2022-10-11 12:00", tz="UTC"))
+    # Registered by the refresh, not built from df.
+    leaderboards = get_leaderboards(df)
+    rebuilt = build_leaderboards(df)
+    for dim in LEADERBOARD_DIMS:
+        top = leaderboards[dim].top(30, "total")
+        assert list(top[dim]) == list(rebuilt[dim].top(30, "total")[dim])
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from leaderboard import (
+    LEADERBOARD_DIMS,
+    build_leaderboards,
+    find_leaderboards,
+    get_leaderboards,
+    replace_days,
+)
+from windows import select_window
+
+WINDOWS = [
+    None,
+    ("2022-09-01", "2022-10-15"),
+    ("2022-08-20", "2022-08-20"),
+    ("2022-10-01", None),
+    ("2023-01-01", "2023-01-05"),
+]
+
+
+def get_top(df, dim, n, by):
+    totals = df.groupby(dim, observed=True)[["total", "sales", "price_count"]].sum()
+    totals["avg_price"] = totals.total / totals.price_count
+    totals = totals[totals.sales > 0].reset_index().astype({dim: str})
+    return totals.sort_values([by, dim], ascending=[False, True])[:n]
+
+
+@pytest.fixture(scope="module")
+def leaderboards(sales):
+    return build_leaderboards(sales)
+
+
+@pytest.mark.parametrize("dim", LEADERBOARD_DIMS)
+@pytest.mark.parametrize("by", ["total", "sales", "price_count", "avg_price"])
+@pytest.mark.parametrize("window", WINDOWS, ids=str)
+def test_top_matches_a_groupby(sales, leaderboards, dim, by, window):
+    expected = get_top(select_window(sales, window), dim, 20, by)
+    top = leaderboards[dim].top(20, by, window)
+    assert list(top[dim]) == list(expected[dim])
+    for col in ["total", "sales", "price_count", "avg_price"]:
+        np.testing.assert_allclose(top[col], expected[col], rtol=1e-6)
+    # The second time the order comes from the cache.
+    assert list(leaderboards[dim].top(20, by, window)[dim]) == list(expected[dim])
+
+
+def test_replace_days_matches_a_rebuild(sales):
+    # The loader replaces the days from the first open one on, with rows that
+    # changed since and players the earlier rows did not have.
+    first_open = pd.Timestamp("2022-10-01")
+    before = sales[sales.date < pd.Timestamp("2022-10-05")]
+    before = before[(before.date < first_open) | (before.total > 100)]
+    before = before.assign(
+        **{dim: before[dim].cat.remove_unused_categories() for dim in LEADERBOARD_DIMS}
+    )
+    delta = sales[sales.date >= first_open]
+
+    updated = replace_days(build_leaderboards(before), delta, first_open)
+    rebuilt = build_leaderboards(sales)
+    for dim in LEADERBOARD_DIMS:
+        for window in WINDOWS:
+            top = updated[dim].top(30, "total", window)
+            expected = rebuilt[dim].top(30, "total", window)
+            assert list(top[dim]) == list(expected[dim])
+            np.testing.assert_allclose(top.total, expected.total, rtol=1e-9)
+
+
+def test_empty_delta_keeps_the_leaderboards(leaderboards, sales):
+    assert replace_days(leaderboards, sales[:0], pd.Timestamp("2022-10-01")) is (
+        leaderboards
+    )
+
+
+def test_leaderboards_are_built_once_per_version(sales):
+    df = sales.copy()
+    df.attrs["version"] = "test-leaderboards"
+    leaderboards = get_leaderboards(df)
+    assert find_leaderboards("test-leaderboards") is leaderboards
+    assert get_leaderboards(df) is leaderboards
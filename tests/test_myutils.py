@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+
+from myutils import format_currency, human_format, human_format_single
+
+
+def format_one(num):
+    # The loop human_format and human_format_single ran per value before they
+    # were vectorized (infinity never left it).
+    magnitude = 0
+    if float(num) >= 0:
+        while abs(num) >= 1000:
+            magnitude += 1
+            num /= 1000.0
+        num = f'{round(num, 2)} {["", "K", "M", "G", "T", "P"][magnitude]}'
+    return num
+
+
+EDGES = [
+    0.0,
+    -0.0,
+    0.004,
+    0.005,
+    0.015,
+    0.125,
+    1.005,
+    2.675,
+    5.0,
+    999.0,
+    999.994,
+    999.995,
+    999.999,
+    1000.0,
+    1234.5,
+    999_949.0,
+    999_950.0,
+    999_995.0,
+    999_999.5,
+    1e6,
+    2.5e9,
+    3.14159e12,
+    7.77e15,
+    999.995e15,
+    -1.0,
+    -1000.5,
+    -2.5e9,
+    np.nan,
+]
+INTEGERS = [0, 1, 5, 999, 1000, 1005, 999_994, 999_995, 10**9, 123_456_789_012, -7]
+
+
+def get_values(seed=0):
+    # Every magnitude, with two and three decimals so rounding is exercised.
+    rng = np.random.default_rng(seed)
+    exponents = rng.integers(-3, 18, 2000)
+    return np.concatenate(
+        [
+            np.round(rng.random(2000) * 10.0**exponents, 3),
+            rng.integers(0, 10**6, 1000) / 1000,
+            rng.integers(0, 10**8, 1000) / 100,
+            EDGES,
+        ]
+    )
+
+
+def assert_same(actual, expected):
+    # NaN is passed through, it is not equal to itself.
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        assert type(a) is type(e) and (a == e or a != a and e != e), (a, e)
+
+
+@pytest.mark.parametrize("to_value", [float, np.float64], ids=["float", "np.float64"])
+def test_single_floats(to_value):
+    values = [to_value(value) for value in get_values()]
+    assert_same(
+        [human_format_single(value) for value in values],
+        [format_one(value) for value in values],
+    )
+
+
+@pytest.mark.parametrize("to_value", [int, np.int64], ids=["int", "np.int64"])
+def test_single_integers(to_value):
+    values = [to_value(value) for value in INTEGERS]
+    assert_same(
+        [human_format_single(value) for value in values],
+        [format_one(value) for value in values],
+    )
+
+
+@pytest.mark.parametrize(
+    "to_value", [float, np.float64, int, np.int64], ids=lambda f: f.__name__
+)
+def test_lists(to_value):
+    values = get_values(1) if to_value in (float, np.float64) else INTEGERS
+    values = [to_value(value) for value in values]
+    assert_same(human_format(values), [format_one(value) for value in values])
+
+
+def test_mixed_lists():
+    values = [5, 5.0, np.float64(2.675), np.int64(1005), 999_950.0, -3, np.nan]
+    assert_same(human_format(values), [format_one(value) for value in values])
+
+
+@pytest.mark.parametrize("dtype", ["float64", "float32", "int64", "int32"])
+def test_arrays_format_like_their_python_values(dtype):
+    values = get_values(2)
+    if dtype.startswith("int"):
+        values = np.nan_to_num(values, nan=0.0)
+        values = values[np.abs(values) < np.iinfo(dtype).max]
+    values = values.astype(dtype)
+    assert_same(human_format(values), [format_one(value) for value in values.tolist()])
+    # Two dimensional arrays (heatmaps) keep their shape.
+    grid = values[: len(values) // 4 * 4].reshape(-1, 4)
+    formatted = human_format(grid)
+    assert len(formatted) == len(grid)
+    for row, values in zip(formatted, grid.tolist()):
+        assert_same(row, [format_one(value) for value in values])
+
+
+def test_currency():
+    values = get_values(3)
+    expected = [
+        None if value != value or value < 0 else "$ " + format_one(value)
+        for value in values.tolist()
+    ]
+    assert list(format_currency(values)) == expected
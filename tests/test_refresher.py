@@ -0,0 +1,130 @@
+import logging
+import threading
+import time
+
+import pytest
+
+from perf import get_counters
+from refresher import Refresher, SingleFlight
+
+
+def get_counter(name):
+    return get_counters().get(name, 0)
+
+
+def run_together(n, fn):
+    # Calls fn from n threads at once, returns what each got back or raised.
+    barrier = threading.Barrier(n)
+    results = [None] * n
+
+    def call(i):
+        barrier.wait()
+        try:
+            results[i] = fn()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+@pytest.mark.parametrize("fails", [False, True])
+def test_concurrent_calls_share_one_run(fails):
+    flight = SingleFlight()
+    calls = []
+
+    def refresh():
+        calls.append(1)
+        # Long enough for every other caller to join the running call.
+        time.sleep(0.2)
+        if fails:
+            raise RuntimeError("query failed")
+        return "rows"
+
+    results = run_together(8, lambda: flight.do("daily_sales", refresh))
+    assert len(calls) == 1
+    if fails:
+        assert all(isinstance(result, RuntimeError) for result in results)
+    else:
+        assert results == ["rows"] * 8
+    assert not flight.is_running("daily_sales")
+    # Later calls run again.
+    flight.do("daily_sales", lambda: calls.append(1))
+    assert len(calls) == 2
+
+
+def test_other_keys_run_on_their_own():
+    flight = SingleFlight()
+    calls = []
+
+    def refresh():
+        calls.append(1)
+        time.sleep(0.1)
+
+    keys = iter(range(4))
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            key = next(keys)
+        return flight.do(key, refresh)
+
+    run_together(4, call)
+    assert len(calls) == 4
+
+
+def test_failed_background_refreshes_are_reported(caplog):
+    refresher = Refresher()
+
+    def refresh():
+        raise RuntimeError("query failed")
+
+    failed = get_counter("refresher.failed")
+    with caplog.at_level(logging.ERROR, logger="refresher"):
+        assert refresher.run_in_background("daily_sales", refresh).result() is False
+    assert get_counter("refresher.failed") == failed + 1
+    [record] = caplog.records
+    assert "daily_sales" in record.getMessage()
+    assert "query failed" in record.exc_text
+    assert refresher.run_in_background("daily_sales", lambda: "rows").result()
+
+
+def test_background_refreshes_join_a_running_one():
+    refresher = Refresher()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def refresh():
+        calls.append(1)
+        started.set()
+        release.wait()
+
+    running = refresher.run_in_background("daily_sales", refresh)
+    started.wait()
+    assert refresher.run_in_background("daily_sales", refresh) is None
+    release.set()
+    assert running.result()
+    assert len(calls) == 1
+
+
+def test_failed_scheduled_refreshes_are_retried(caplog):
+    refresher = Refresher(retry=0.05)
+    calls = []
+    done = threading.Event()
+
+    def refresh():
+        calls.append(1)
+        if len(calls) < 3:
+            raise RuntimeError("query failed")
+        done.set()
+
+    with caplog.at_level(logging.ERROR, logger="refresher"):
+        refresher.schedule("daily_sales", refresh, interval=60, delay=0)
+        assert done.wait(5)
+    refresher.cancel("daily_sales")
+    assert len(calls) == 3
+    assert len([r for r in caplog.records if r.levelno == logging.ERROR]) == 2
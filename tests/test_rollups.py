@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from hll import SKETCHES
+from rollups import ESTIMATES, MEASURES, Rollup, get_rollup, keep_top, lump_other
+from tdigest import DIGESTS
+
+GRAINS = [("season",), ("team",), ("season", "team"), ("moment_tier", "play_type")]
+FINER = [
+    ("season", "team", "player_position"),
+    ("season", "week", "team"),
+    ("moment_tier", "play_type", "team"),
+]
+
+
+@pytest.fixture(scope="module")
+def missing(sales):
+    # Sales of moments without a position or a week, the grain queries keep
+    # them in a group of their own.
+    rng = np.random.default_rng(3)
+    df = sales.copy()
+    df.loc[rng.random(len(df)) < 0.05, "player_position"] = np.nan
+    df.loc[rng.random(len(df)) < 0.05, "week"] = pd.NA
+    return df
+
+
+def assert_same_grain(actual, expected):
+    assert list(actual.columns) == list(expected.columns)
+    assert len(actual) == len(expected)
+    # Digests merged in another order compress to other centroids, their
+    # quantiles stay close.
+    quantiles = [col for names in DIGESTS.values() for col in names]
+    for col in expected.columns:
+        if col in DIGESTS:
+            continue
+        if col in quantiles:
+            np.testing.assert_allclose(actual[col], expected[col], rtol=0.02)
+        elif expected[col].dtype.kind == "f":
+            np.testing.assert_allclose(actual[col], expected[col], rtol=1e-5)
+        else:
+            assert list(actual[col]) == list(expected[col]), col
+
+
+@pytest.mark.parametrize("data", ["sales", "missing"])
+def test_grains_do_not_depend_on_the_order_they_are_built(request, data):
+    df = request.getfixturevalue(data)
+    for dims in GRAINS:
+        direct = Rollup(df).get(*dims, estimates=ESTIMATES)
+        rollup = Rollup(df)
+        for finer in FINER:
+            rollup.get(*finer, estimates=ESTIMATES)
+        assert_same_grain(rollup.get(*dims, estimates=ESTIMATES), direct)
+        assert direct.sales.sum() == df.sales.sum()
+
+
+def test_only_finer_grains_without_missing_keys_stand_in_for_the_rows(missing):
+    rollup = Rollup(missing)
+    rollup.get("season", "team", "moment_tier", estimates=ESTIMATES)
+    rollup.get("season", "team", "player_position", estimates=ESTIMATES)
+    assert not rollup._has_nulls("moment_tier")
+    assert rollup._has_nulls("player_position")
+    # Sketches merged from the finer grain are the ones of the rows.
+    grain = rollup.get("season", "team", estimates=ESTIMATES)
+    direct = Rollup(missing).get("season", "team", estimates=ESTIMATES)
+    for col in SKETCHES:
+        assert list(grain[col]) == list(direct[col])
+
+
+def test_sketches_are_only_merged_for_the_estimates_read(sales):
+    rollup = Rollup(sales)
+    grain = rollup.get("season", "team")
+    assert not set(ESTIMATES) & set(grain.columns)
+    assert not set(ESTIMATES.values()) & set(grain.columns)
+
+    buyers = rollup.get("season", "team", estimates=["unique_buyers"])
+    assert "unique_buyers" in buyers and "unique_sellers" not in buyers
+    assert_same_grain(buyers[grain.columns], grain)
+    # Merged once, later reads get the same frame.
+    assert rollup.get("season", "team", estimates=["unique_buyers"]) is buyers
+    assert rollup.get("season", "team") is buyers
+
+    everything = Rollup(sales).get("season", "team", estimates=ESTIMATES)
+    assert_same_grain(rollup.get("season", "team", estimates=ESTIMATES), everything)
+
+
+def test_keep_top_keeps_the_order_of_top(sales):
+    grain = Rollup(sales).get("team", "season")
+    top = Rollup(sales).top("team", 5, "sales")
+    kept = keep_top(grain, top, "team")
+    assert list(dict.fromkeys(kept.team)) == list(top.team)
+    assert set(kept.team) == set(top.team)
+    assert len(kept) == grain.team.isin(top.team).sum()
+
+
+@pytest.mark.parametrize("budget", [2, 8, 100])
+def test_lump_other_keeps_the_totals(sales, budget):
+    grain = Rollup(sales).get("team", "season")
+    lumped = lump_other(grain, "team", ["team", "season"], MEASURES, budget=budget)
+    teams = grain.team.nunique()
+    assert lumped.team.nunique() == min(budget, teams)
+    if teams > budget:
+        assert lumped.team.cat.categories[-1] == "Other"
+        top = grain.groupby("team", observed=True).total.sum().nlargest(budget - 1)
+        assert set(lumped.team.cat.categories[:-1]) == set(top.index)
+    for col in MEASURES:
+        assert lumped[col].sum() == pytest.approx(grain[col].sum())
+
+
+def test_rollups_are_kept_per_version_and_timeframe(sales):
+    df = sales.copy()
+    df.attrs["version"] = "test-rollups"
+    rollup = get_rollup(df)
+    assert get_rollup(df) is rollup
+    window = get_rollup(df, "last_week", lambda rows: rows[-100:])
+    assert window is not rollup and len(window.df) == 100
+    assert window.rows is df
+    assert get_rollup(df, "last_week", lambda rows: rows[-100:]) is window
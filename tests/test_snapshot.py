@@ -0,0 +1,105 @@
+import os
+
+import pandas as pd
+import pytest
+
+from ingest import merge_delta
+from snapshot import get_version, list_snapshots, read_snapshot, write_snapshot
+
+WATERMARK = pd.Timestamp("2022-10-04")
+FIRST_OPEN = pd.Timestamp("2022-10-05")
+
+
+def assert_same_rows(actual, expected):
+    # Same rows and values, the categories come back sorted.
+    def to_str(df):
+        categories = df.select_dtypes("category").columns
+        return df.reset_index(drop=True).astype({col: str for col in categories})
+
+    actual, expected = to_str(actual), to_str(expected)
+    assert list(actual.dtypes) == list(expected.dtypes)
+    assert actual.equals(expected)
+
+
+def get_inodes(path):
+    return {
+        os.path.join(name, file): os.stat(os.path.join(path, name, file)).st_ino
+        for name in os.listdir(path)
+        if name.startswith("date=")
+        for file in os.listdir(os.path.join(path, name))
+    }
+
+
+@pytest.fixture
+def refreshes(sales):
+    # A full load up to the watermark, then a refresh that reopens the days
+    # from FIRST_OPEN on with rows that changed since.
+    before = sales[sales.date < pd.Timestamp("2022-10-10")]
+    before = before[(before.date < FIRST_OPEN) | (before.total > 50)]
+    after = merge_delta(before, sales[sales.date >= FIRST_OPEN], FIRST_OPEN)
+    first = pd.Timestamp("2022-10-10 12:00", tz="UTC")
+    return before, after, first, pd.Timestamp("2022-10-11 12:00", tz="UTC")
+
+
+def test_snapshots_only_write_the_reopened_days(tmp_path, refreshes):
+    before, after, first, second = refreshes
+    root = str(tmp_path)
+    write_snapshot(before, WATERMARK, first, root=root)
+    version = write_snapshot(
+        after, WATERMARK, second, first_open_date=FIRST_OPEN, previous=first, root=root
+    )
+
+    snapshot = read_snapshot(version, root)
+    assert_same_rows(snapshot["df"], after)
+    assert snapshot["refreshed_at"] == second
+
+    # The closed days are the files of the first snapshot, the open ones new.
+    old = get_inodes(os.path.join(root, get_version(first)))
+    new = get_inodes(os.path.join(root, version))
+    closed = {name for name in new if name < f"date={FIRST_OPEN:%Y-%m-%d}"}
+    assert closed and all(new[name] == old.get(name) for name in closed)
+    reopened = {new[name] for name in new if name not in closed}
+    assert reopened and not reopened & set(old.values())
+
+    # The links outlive the snapshots they came from.
+    third = second + pd.Timedelta(hours=1)
+    version = write_snapshot(
+        after,
+        WATERMARK,
+        third,
+        first_open_date=FIRST_OPEN,
+        previous=second,
+        root=root,
+        keep=1,
+    )
+    assert list_snapshots(root) == [version]
+    assert_same_rows(read_snapshot(version, root)["df"], after)
+
+
+@pytest.mark.parametrize("previous", [None, "pruned"])
+def test_snapshots_are_written_whole_without_the_previous_one(
+    tmp_path, refreshes, previous
+):
+    _, after, first, second = refreshes
+    previous = first if previous else None
+    version = write_snapshot(
+        after,
+        WATERMARK,
+        second,
+        first_open_date=FIRST_OPEN,
+        previous=previous,
+        root=str(tmp_path),
+    )
+    assert_same_rows(read_snapshot(version, str(tmp_path))["df"], after)
+
+
+def test_refreshes_without_open_rows(tmp_path, sales):
+    root = str(tmp_path)
+    before = sales[sales.date < FIRST_OPEN]
+    first = pd.Timestamp("2022-10-10 12:00", tz="UTC")
+    second = pd.Timestamp("2022-10-11 12:00", tz="UTC")
+    write_snapshot(before, WATERMARK, first, root=root)
+    version = write_snapshot(
+        before, WATERMARK, second, first_open_date=FIRST_OPEN, previous=first, root=root
+    )
+    assert_same_rows(read_snapshot(version, root)["df"], before)
@@ -0,0 +1,96 @@
+import json
+
+import numpy as np
+import pytest
+
+from tdigest import (
+    COMPRESSION,
+    DIGEST_DTYPE,
+    from_exports,
+    get_quantiles,
+    merge_digests,
+    to_export,
+)
+
+
+def get_digest(prices):
+    # One centroid per sale, like APPROX_PERCENTILE_ACCUMULATE keeps for a
+    # handful of values.
+    digest = np.empty(len(prices), DIGEST_DTYPE)
+    digest["mean"] = np.sort(prices)
+    digest["weight"] = 1
+    return digest.tobytes()
+
+
+def get_rows(seed, n_rows=2_000, n_groups=4):
+    rng = np.random.default_rng(seed)
+    prices = [rng.lognormal(3, 1, rng.integers(1, 20)) for _ in range(n_rows)]
+    return prices, rng.integers(0, n_groups, n_rows)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_quantiles_are_close_to_the_exact_ones(seed):
+    prices, groups = get_rows(seed)
+    _, values = merge_digests([get_digest(p) for p in prices], groups, 4, (0.5, 0.95))
+    for group in range(4):
+        sales = np.concatenate([p for p, g in zip(prices, groups) if g == group])
+        for q in (0.5, 0.95):
+            exact = np.quantile(sales, q)
+            assert values[q][group] == pytest.approx(exact, rel=0.03)
+
+
+def test_merged_digests_are_compressed_and_keep_every_sale():
+    prices, groups = get_rows(3)
+    merged, _ = merge_digests([get_digest(p) for p in prices], groups, 4)
+    for group in range(4):
+        digest = np.frombuffer(merged[group], DIGEST_DTYPE)
+        sales = np.concatenate([p for p, g in zip(prices, groups) if g == group])
+        assert len(digest) <= COMPRESSION + 1
+        assert np.all(np.diff(digest["mean"]) >= 0)
+        assert digest["weight"].sum() == len(sales)
+        assert (digest["mean"] * digest["weight"]).sum() == pytest.approx(sales.sum())
+        # The tails stay single sales.
+        assert digest["mean"][0] == sales.min()
+        assert digest["mean"][-1] == sales.max()
+
+
+def test_merging_merged_digests_again():
+    # Rollups of rollups merge digests that were merged before.
+    prices, groups = get_rows(4, n_groups=8)
+    digests = [get_digest(p) for p in prices]
+    fine, _ = merge_digests(digests, groups, 8)
+    _, direct = merge_digests(digests, groups % 2, 2, (0.5,))
+    _, rolled = merge_digests(fine, np.arange(8) % 2, 2, (0.5,))
+    np.testing.assert_allclose(rolled[0.5], direct[0.5], rtol=0.02)
+
+
+def test_empty_groups_have_no_quantiles():
+    merged, values = merge_digests([get_digest([1.0, 2.0]), b""], [1, 0], 3, (0.5,))
+    assert merged[0] == b"" and merged[2] == b""
+    assert np.isnan(values[0.5][0]) and np.isnan(values[0.5][2])
+    assert values[0.5][1] == pytest.approx(1.5)
+
+
+def test_single_centroid():
+    values = get_quantiles(np.array([5.0]), np.array([3.0]), np.array([1]), [0.5])
+    assert values[0.5][0] == 5.0
+
+
+def test_export_round_trip():
+    # A column of exports is decoded at once, as objects or as their JSON.
+    digests = [get_digest([3.0, 1.0, 2.0]), get_digest([5.0]), b""]
+    exports = [to_export(digest) for digest in digests] + [
+        {"state": [2.0, 1.0, 1.0, 2.0]},
+        None,
+        "",
+    ]
+    expected = digests + [
+        np.array([(1.0, 2.0), (2.0, 1.0)], DIGEST_DTYPE).tobytes(),
+        b"",
+        b"",
+    ]
+    for values in [
+        exports,
+        [json.dumps(value) if value else value for value in exports],
+    ]:
+        assert from_exports(values).to_pylist() == expected
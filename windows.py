@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+from nflcalendar import load_calendar
+
+CUSTOM_WINDOW = "Custom range"
+# The whole data, e.g. the daily tab.
+ALL_DATES = "All dates"
+
+
+def next_day(date):
+    return (pd.Timestamp(date) + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def get_named_windows(calendar=None, today=None):
+    # Label -> (start, end) of inclusive dates, None for an open end. Only
+    # windows that have started by today are offered.
+    calendar = calendar or load_calendar()
+    today = pd.Timestamp.now().normalize() if today is None else pd.Timestamp(today)
+    phases = calendar.get_phases(end=today)
+    game_windows = calendar.get_game_windows(end=today)
+    # The year is only needed to tell the seasons apart.
+    years = {window["year"] for window in phases + game_windows}
+
+    def get_label(window):
+        name = window["name"]
+        return f"{name} {window['year']}" if len(years) > 1 else name
+
+    windows = {}
+    preseasons = [window for window in phases if window["name"] == "Preseason"]
+    if preseasons:
+        # The tabs' commentary is written against these two.
+        preseason = preseasons[-1]
+        windows["During Preseason"] = (preseason["start"], preseason["end"])
+        windows["After Preseason"] = (next_day(preseason["end"]), None)
+        phases = [window for window in phases if window is not preseason]
+    for window in phases + game_windows:
+        windows[get_label(window)] = (window["start"], window["end"])
+    return windows
+
+
+def get_custom_label(window):
+    return f"from {window[0]} to {window[1]}"
+
+
+def get_bounds(dates, window):
+    # Positions of the window in dates sorted ascending (see schema.normalize),
+    # two binary searches instead of a mask over every row.
+    start, end = window or (None, None)
+    lo = 0 if not start else dates.searchsorted(np.datetime64(start, "ns"), "left")
+    hi = (
+        len(dates)
+        if not end
+        else dates.searchsorted(np.datetime64(next_day(end), "ns"), "left")
+    )
+    return lo, hi
+
+
+def select_window(df, window):
+    # A slice, so the rows stay views on the loaded frame.
+    if not window or window == (None, None):
+        return df
+    lo, hi = get_bounds(df["date"].values, window)
+    return df.iloc[lo:hi]